@@ -1,2 +1,28 @@
 # -*- coding: utf-8 -*-
-"""Zhai Agent包初始化文件"""
\ No newline at end of file
+"""Zhai Agent包初始化文件"""
+import logging
+
+_LOGGING_CONFIGURED = False
+
+
+def configure_logging():
+    """
+    配置项目日志，整个进程只生效一次
+    全局根日志级别设为 INFO，neo4j、urllib3 等第三方库默认只打印 INFO 及以上级别的日志；
+    zhai_agent 下的 logger 使用配置项 LOG_LEVEL（默认 INFO）。已有的 handler 会被保留
+    """
+    global _LOGGING_CONFIGURED
+    if _LOGGING_CONFIGURED:
+        return
+    root = logging.getLogger()
+    if root.handlers:
+        # 调用方已配置过日志，只调整级别，不重建handler
+        root.setLevel(logging.INFO)
+    else:
+        logging.basicConfig(
+            level=logging.INFO,
+            format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+        )
+    from .config import settings
+    logging.getLogger("zhai_agent").setLevel(settings.LOG_LEVEL)
+    _LOGGING_CONFIGURED = True
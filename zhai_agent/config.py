@@ -36,6 +36,10 @@ class Config:
     REDIS_DB = int(os.getenv("REDIS_DB", 0))
     REDIS_PASSWORD = os.getenv("REDIS_PASSWORD", None)
     
+    # --- 日志配置 ---
+    # zhai_agent 下 logger 的日志级别，排查问题时可设为 DEBUG
+    LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+
     # --- RAG 配置 ---
     RAG_MODEL_NAME = os.getenv("RAG_MODEL_NAME", "BAAI/bge-reranker-base")
 
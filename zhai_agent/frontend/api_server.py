@@ -11,12 +11,27 @@ import json
 from fastapi.responses import StreamingResponse
 from langchain_core.messages import HumanMessage
 import logging
+# 尝试导入orjson加速流式响应的序列化，但不强制要求
+ORJSON_AVAILABLE = False
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    pass
 
 # 配置日志
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 SESSIONS = {}
+
+
+def _ndjson_line(payload: dict) -> str:
+    """ 序列化为一行 NDJSON，优先使用orjson """
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(payload).decode() + "\n"
+    return json.dumps(payload, ensure_ascii=False) + "\n"
+
 # 添加项目根目录到Python路径
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 
@@ -170,7 +185,18 @@ async def chat(
 
             # 3. 异步监听工作流事件 (使用 astream)
             # stream_mode="updates" 意味着每当一个节点跑完，我们就会收到通知
-            async for event in workflow_manager.app.astream(inputs, stream_mode="updates"):
+            # stream_mode="custom" 会在回复生成过程中逐段收到 {"token": 片段}
+            async for mode, event in workflow_manager.app.astream(inputs, stream_mode=["updates", "custom"]):
+                
+                # 情况 0: 回复片段 -> 立即推送，前端可据此实现逐字显示
+                if mode == "custom":
+                    if "token" in event:
+                        yield _ndjson_line({
+                            "type": "token",
+                            "response": event["token"],
+                            "success": True
+                        })
+                    continue
                 
                 # 情况 A: 聊天节点完成 (generate_answer) -> 立即推送给前端
                 if "generate_answer" in event:
@@ -181,12 +207,11 @@ async def chat(
                     content = ai_msg.content if hasattr(ai_msg, 'content') else str(ai_msg)
                     
                     # 构建数据包，使用 JSON 格式，末尾加换行符分隔
-                    data = json.dumps({
+                    yield _ndjson_line({
                         "type": "answer",
                         "response": content,
                         "success": True
-                    }, ensure_ascii=False)
-                    yield f"{data}\n"
+                    })
                 
                 # 情况 B: (可选) 只是为了调试，你可以推送后台状态
                 # 前端可以选择忽略这些类型的信息
@@ -203,7 +228,7 @@ async def chat(
         logger.error(f"API 错误: {e}")
         # 流式错误处理比较特殊，这里简单返回一个包含错误的 JSON
         return StreamingResponse(
-            iter([json.dumps({"type": "error", "response": str(e)}, ensure_ascii=False) + "\n"]),
+            iter([_ndjson_line({"type": "error", "response": str(e)})]),
             media_type="application/x-ndjson"
         )
 
@@ -1,16 +1,26 @@
 from typing import List, Dict, Any, Optional, Tuple
 from datetime import datetime
 import json
+import time
+import atexit
 import logging
+import threading
 from .kg_storage import KGStorage
 
 logger = logging.getLogger(__name__)
 
+# 图统计信息缓存时间（秒），统计只在写入后变化，写操作会主动失效缓存
+STATS_CACHE_TTL = 60
+
 class KGManager:
     """知识图谱管理器 - 封装知识图谱的核心操作"""
     
     def __init__(self):
         self.storage = KGStorage()
+        # 图统计信息缓存：(统计结果, 写入时间)
+        self._stats_cache = (None, 0.0)
+        # 每次写入递增，查询统计期间发生过写入时不缓存查询结果
+        self._stats_version = 0
         logger.info("知识图谱管理器初始化完成")
     
     def __enter__(self):
@@ -25,6 +35,11 @@ class KGManager:
             self.storage.close()
             logger.info("知识图谱连接已关闭")
     
+    def _invalidate_stats(self):
+        """写入完成后失效图统计信息缓存"""
+        self._stats_version += 1
+        self._stats_cache = (None, 0.0)
+    
     # ==================== 实体管理 ====================
     
     def create_entity(self, name: str, entity_type: str, properties: Dict[str, Any] = None) -> bool:
@@ -42,6 +57,7 @@ class KGManager:
         try:
             # create_entity 使用 MERGE 语句，无论实体是否存在都会成功
             entity_info = self.storage.create_entity(name, entity_type, properties or {})
+            self._invalidate_stats()
             if entity_info:
                 logger.info(f"创建/更新实体成功: {name} ({entity_type})")
                 return True
@@ -89,6 +105,7 @@ class KGManager:
         """
         try:
             success = self.storage.update_entity(name, entity_type, properties)
+            self._invalidate_stats()
             if success:
                 logger.info(f"更新实体成功: {name} ({entity_type})")
             else:
@@ -111,6 +128,7 @@ class KGManager:
         """
         try:
             success = self.storage.delete_entity(name, entity_type)
+            self._invalidate_stats()
             if success:
                 logger.info(f"删除实体成功: {name}")
             else:
@@ -180,6 +198,7 @@ class KGManager:
         try:
             self.storage.create_relationship(subj_name, subj_type, rel_type, 
                                            obj_name, obj_type, properties or {})
+            self._invalidate_stats()
             logger.info(f"创建关系成功: {subj_name} -[{rel_type}]-> {obj_name}")
             return True
         except Exception as e:
@@ -225,6 +244,7 @@ class KGManager:
         """
         try:
             success = self.storage.delete_relationship(subj_name, subj_type, rel_type, obj_name, obj_type)
+            self._invalidate_stats()
             if success:
                 logger.info(f"删除关系成功: {subj_name} -[{rel_type}]-> {obj_name}")
             else:
@@ -248,6 +268,7 @@ class KGManager:
         """
         try:
             self.storage.batch_create_entities(entities)
+            self._invalidate_stats()
             logger.info(f"批量创建实体成功: 数量={len(entities)}")
             return True
         except Exception as e:
@@ -266,6 +287,7 @@ class KGManager:
         """
         try:
             self.storage.batch_create_relationships(relationships)
+            self._invalidate_stats()
             logger.info(f"批量创建关系成功: 数量={len(relationships)}")
             return True
         except Exception as e:
@@ -281,8 +303,15 @@ class KGManager:
         Returns:
             统计信息字典
         """
+        stats, cached_at = self._stats_cache
+        if stats is not None and time.monotonic() - cached_at < STATS_CACHE_TTL:
+            return stats
         try:
+            version = self._stats_version
             stats = self.storage.get_graph_stats()
+            # 查询期间有写入完成时，结果可能是写入前的统计，不写入缓存
+            if version == self._stats_version:
+                self._stats_cache = (stats, time.monotonic())
             logger.info("获取图统计信息成功")
             return stats
         except Exception as e:
@@ -385,6 +414,8 @@ class KGManager:
         """
         try:
             results = self.storage.run_cypher(cypher, parameters or {})
+            # 自定义查询可能包含写入，保守地失效统计缓存
+            self._invalidate_stats()
             logger.info(f"执行自定义查询成功: 返回{len(results)}条结果")
             return results
         except Exception as e:
@@ -464,7 +495,9 @@ class KGManager:
                     RETURN s.name as subject, o.name as object, type(r) as predicate
                 """
                 result = session.run(cypher, subject=subject, object=object, properties=properties or {})
-                if result.single():
+                record = result.single()
+                self._invalidate_stats()
+                if record:
                     logger.info(f"创建知识三元组成功: {subject} -[{predicate}]-> {object}")
                     return True
                 else:
@@ -529,4 +562,20 @@ class KGManager:
             return True
         except Exception as e:
             logger.error(f"从三元组导入失败: {str(e)}")
-            return False
\ No newline at end of file
+            return False
+
+
+# 全局实例管理：工具调用共享同一个驱动连接池，不再每次调用都重新建立连接
+_instance = None
+_instance_lock = threading.Lock()
+
+
+def get_kg_manager_instance() -> KGManager:
+    global _instance
+    if _instance is None:
+        # 加锁后再次检查，避免多个线程同时初始化创建出多个驱动
+        with _instance_lock:
+            if _instance is None:
+                _instance = KGManager()
+                atexit.register(_instance.close)
+    return _instance
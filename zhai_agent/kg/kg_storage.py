@@ -13,6 +13,9 @@ AUTH = ("neo4j", "huafan123")
 # 定义合法的标签/关系类型格式（Neo4j要求：字母开头，可包含字母、数字、下划线）
 VALID_LABEL_PATTERN = re.compile(r'^[a-zA-Z][a-zA-Z0-9_]*$')
 
+# 驱动连接池上限，进程内共享同一个驱动
+NEO4J_MAX_POOL_SIZE = 50
+
 class KGStorage:
     def __init__(self):
         """初始化Neo4j连接"""
@@ -20,7 +23,8 @@ class KGStorage:
             self.driver = GraphDatabase.driver(
                 settings.NEO4J_URI,
                 auth=(settings.NEO4J_USER, settings.NEO4J_PASSWORD),
-                max_connection_lifetime=3600  # 连接最大生命周期1小时
+                max_connection_lifetime=3600,  # 连接最大生命周期1小时
+                max_connection_pool_size=NEO4J_MAX_POOL_SIZE
             )
             # 测试连接
             self.driver.verify_connectivity()
@@ -1,7 +1,7 @@
 from typing import Dict, Any, List, Optional, Union
 from pydantic import BaseModel, Field
 from langchain_core.tools import tool
-from .kg_manager import KGManager
+from .kg_manager import get_kg_manager_instance
 import json
 import logging
 
@@ -61,13 +61,14 @@ class KGTools:
     """知识图谱工具集合"""
     
     def __init__(self):
-        self.kg_manager = KGManager()
+        # 复用进程级共享实例，连接在进程退出时统一关闭
+        self.kg_manager = get_kg_manager_instance()
     
     def __enter__(self):
         return self
     
     def __exit__(self, exc_type, exc_val, exc_tb):
-        self.kg_manager.close()
+        pass
 
 # 创建实体工具
 @tool("kg_create_entity", args_schema=EntityCreateInput, return_direct=False)
@@ -1,11 +1,17 @@
 # -*- coding: utf-8 -*-
 import os
+import asyncio
 import logging
+import httpx
 import openai
+from typing import AsyncIterator
 from ..config import settings
 
 logger = logging.getLogger(__name__)
 
+# 异步客户端的连接池上限
+ASYNC_MAX_CONNECTIONS = 100
+
 
 class LLMClient:
     """
@@ -27,6 +33,38 @@ class LLMClient:
         
         if not self.api_key:
             logger.warning("未检测到 DEEPSEEK_API_KEY，LLM 功能可能不可用。")
+        
+        # 客户端按需创建并复用，避免每次调用都重新建立连接
+        self._client = None
+        self._async_client = None
+        self._async_loop = None
+    
+    def _get_client(self):
+        """
+        获取同步客户端
+        """
+        if self._client is None:
+            self._client = openai.OpenAI(
+                api_key=self.api_key,
+                base_url=self.base_url
+            )
+        return self._client
+    
+    def _get_async_client(self):
+        """
+        获取异步客户端，连接池绑定在事件循环上，事件循环变化时重新创建
+        """
+        loop = asyncio.get_running_loop()
+        if self._async_client is None or self._async_loop is not loop:
+            self._async_client = openai.AsyncOpenAI(
+                api_key=self.api_key,
+                base_url=self.base_url,
+                http_client=httpx.AsyncClient(
+                    limits=httpx.Limits(max_connections=ASYNC_MAX_CONNECTIONS)
+                )
+            )
+            self._async_loop = loop
+        return self._async_client
     
     def call_model(self, prompt, temperature=0.9, max_tokens=2000):
         """
@@ -39,13 +77,8 @@ class LLMClient:
             str: 模型响应
         """
         try:
-            client = openai.OpenAI(
-                api_key=self.api_key,
-                base_url=self.base_url
-            )
-            
             # 调用模型
-            response = client.chat.completions.create(
+            response = self._get_client().chat.completions.create(
                 model=self.model_name,
                 messages=[{"role": "user", "content": prompt}],
                 temperature=temperature,
@@ -61,7 +94,35 @@ class LLMClient:
             error_message = f"调用语言模型时出错: {str(e)}"
             logger.error(error_message)
             return error_message
-    
+
+    async def astream_model(self, prompt, temperature=0.9, max_tokens=2000) -> AsyncIterator[str]:
+        """
+        流式调用语言模型，生成一段就产出一段，降低首字延迟
+        Args:
+            prompt: 提示内容
+            temperature: 温度参数，控制输出的随机性
+            max_tokens: 最大生成令牌数
+        Returns:
+            AsyncIterator[str]: 模型响应片段
+        """
+        try:
+            stream = await self._get_async_client().chat.completions.create(
+                model=self.model_name,
+                messages=[{"role": "user", "content": prompt}],
+                temperature=temperature,
+                max_tokens=max_tokens,
+                stream=True
+            )
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+
+        except Exception as e:
+            # 错误处理，与 call_model 一致返回错误提示
+            error_message = f"调用语言模型时出错: {str(e)}"
+            logger.error(error_message)
+            yield error_message
+
     def create_chat_completion(self, messages, temperature=0.9, max_tokens=2000, tools=None, tool_choice=None):
         """
         创建聊天完成，支持工具调用
@@ -80,49 +141,74 @@ class LLMClient:
             }
         """
         try:
-            client = openai.OpenAI(
-                api_key=self.api_key,
-                base_url=self.base_url
-            )
-            
-            # 构建请求参数
-            request_params = {
-                "model": self.model_name,
-                "messages": messages,
-                "temperature": temperature,
-                "max_tokens": max_tokens
-            }
-            
-            # 如果有工具，添加到请求参数
-            if tools:
-                request_params["tools"] = tools
-                if tool_choice:
-                    request_params["tool_choice"] = tool_choice
-            
             # 调用模型
-            response = client.chat.completions.create(**request_params)
-            
-            # 获取响应信息
-            choice = response.choices[0]
-            ai_response = choice.message.content or ""
-            tool_calls = getattr(choice.message, 'tool_calls', []) or []
-            finish_reason = choice.finish_reason
+            response = self._get_client().chat.completions.create(
+                **self._build_request_params(messages, temperature, max_tokens, tools, tool_choice)
+            )
+            return self._parse_completion(response)
             
-            return {
-                "content": ai_response,
-                "tool_calls": tool_calls,
-                "finish_reason": finish_reason
-            }
+        except Exception as e:
+            return self._completion_error(e)
+    
+    async def acreate_chat_completion(self, messages, temperature=0.9, max_tokens=2000, tools=None, tool_choice=None):
+        """
+        异步创建聊天完成，参数和返回值与 create_chat_completion 相同
+        """
+        try:
+            response = await self._get_async_client().chat.completions.create(
+                **self._build_request_params(messages, temperature, max_tokens, tools, tool_choice)
+            )
+            return self._parse_completion(response)
             
         except Exception as e:
-            # 错误处理
-            error_message = f"创建聊天完成时出错: {str(e)}"
-            logger.error(error_message)
-            return {
-                "content": error_message,
-                "tool_calls": [],
-                "finish_reason": "error"
-            }
+            return self._completion_error(e)
+    
+    def _build_request_params(self, messages, temperature, max_tokens, tools, tool_choice):
+        """
+        构建请求参数
+        """
+        request_params = {
+            "model": self.model_name,
+            "messages": messages,
+            "temperature": temperature,
+            "max_tokens": max_tokens
+        }
+        
+        # 如果有工具，添加到请求参数
+        if tools:
+            request_params["tools"] = tools
+            if tool_choice:
+                request_params["tool_choice"] = tool_choice
+        return request_params
+    
+    @staticmethod
+    def _parse_completion(response):
+        """
+        获取响应信息
+        """
+        choice = response.choices[0]
+        ai_response = choice.message.content or ""
+        tool_calls = getattr(choice.message, 'tool_calls', []) or []
+        finish_reason = choice.finish_reason
+        
+        return {
+            "content": ai_response,
+            "tool_calls": tool_calls,
+            "finish_reason": finish_reason
+        }
+    
+    @staticmethod
+    def _completion_error(e):
+        """
+        错误处理
+        """
+        error_message = f"创建聊天完成时出错: {str(e)}"
+        logger.error(error_message)
+        return {
+            "content": error_message,
+            "tool_calls": [],
+            "finish_reason": "error"
+        }
 
 
 def get_llm_client(api_key=None, base_url=None, model_name="deepseek-chat"):
@@ -3,14 +3,16 @@
 Zhai Agent 主模块
 """
 
+import asyncio
 import logging
+from zhai_agent import configure_logging
 from zhai_agent.document_processor.document_loader import DocumentLoader
 from zhai_agent.vector_store.vector_store_manager import VectorStoreManager
 from zhai_agent.workflow.workflow_manager import WorkflowManager
 from zhai_agent.ui.user_interface import UserInterface
 
 # 配置日志
-logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+configure_logging()
 logger = logging.getLogger(__name__)
 
 
@@ -77,28 +79,35 @@ def run_chatbot():
     user_name = user_interface.get_user_name()
     logger.info(f"用户名称: {user_name}")
     
+    # 整个会话共用一个事件循环：异步LLM客户端及其连接池绑定在事件循环上，
+    # 每轮都新建事件循环会让上一轮的客户端连同连接池一起被遗弃
+    loop = asyncio.new_event_loop()
+    
     # 主循环
     logger.info("进入主循环，等待用户输入...")
-    while True:
-        # 获取用户输入
-        user_input = user_interface.get_user_input()
-        
-        if user_input.lower() == 'exit':
-            logger.info("用户选择退出程序")
-            user_interface.handle_exit()
-            break
-        
-        logger.info(f"收到用户输入: {user_input[:50]}...")
-        
-        # 使用process_user_request方法处理请求
-        result = workflow_manager.process_user_request(
-            user_message=user_input,
-            user_name=user_name
-        )
-        
-        # 显示AI响应
-        user_interface.display_ai_response(result)
-        logger.info("AI响应已显示")
+    try:
+        while True:
+            # 获取用户输入
+            user_input = user_interface.get_user_input()
+            
+            if user_input.lower() == 'exit':
+                logger.info("用户选择退出程序")
+                user_interface.handle_exit()
+                break
+            
+            logger.info(f"收到用户输入: {user_input[:50]}...")
+            
+            # 流式处理请求，回复生成后立即显示
+            loop.run_until_complete(user_interface.display_ai_response_stream(
+                workflow_manager.stream_user_request(
+                    user_message=user_input,
+                    user_name=user_name
+                )
+            ))
+            logger.info("AI响应已显示")
+    finally:
+        loop.run_until_complete(loop.shutdown_asyncgens())
+        loop.close()
 
 
 if __name__ == "__main__":
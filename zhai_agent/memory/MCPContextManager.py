@@ -4,8 +4,13 @@ MCP上下文管理器模块
 提供会话上下文管理功能，使用MemoryManager处理记忆操作
 """
 import logging
+import itertools
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, Future
 from typing import List, Dict, Any, Optional
 from contextlib import contextmanager
+from functools import partial
 from datetime import datetime
 import uuid
 from ..config import settings
@@ -15,12 +20,30 @@ from zhai_agent.memory.memory_manager import MemoryManager, ShortTermMemoryBacke
 
 logger = logging.getLogger(__name__)
 
+# 模块级别名，省去热路径上的属性查找
+_uuid4 = uuid.uuid4
+_now = datetime.now
+
 
 class MCPContextManager:
     """
     MCP上下文管理器
     统一管理短期记忆和长期记忆，提供会话上下文的完整生命周期管理
     """
+
+    # 标准消息字段及默认值（message_id、timestamp、additional_kwargs 按条单独生成）
+    _MSG_SCHEMA = (
+        ("type", "human"),
+        ("content", ""),
+        ("name", None),
+        ("importance_score", 0.0),
+    )
+
+    # 短期记忆后台写入线程池（所有实例共享），退出上下文时不再阻塞等待Redis确认
+    _IO_POOL = ThreadPoolExecutor(max_workers=4, thread_name_prefix="mcp-memory-io")
+    # 每个用户最近一次提交的写入任务，用于保证同一用户的写入顺序
+    _pending_writes: Dict[str, Future] = {}
+    _pending_lock = threading.Lock()
     
     def __init__(self, 
                  user_id: str,
@@ -37,6 +60,7 @@ class MCPContextManager:
                  short_memory_max_size: int = 10,
                  long_memory_importance_threshold: float = 0.5):
         self.user_id = user_id
+        self.short_memory_max_size = short_memory_max_size
         # 初始化具体记忆实例
         short_memory_instance = ShortMemory(
             host=redis_host or settings.REDIS_HOST,
@@ -63,10 +87,16 @@ class MCPContextManager:
         self.memory_manager = MemoryManager(short_memory_backend, long_memory_backend)
         self.memory_manager.set_long_memory_threshold(long_memory_importance_threshold)
         
-        self.context_history = []
+        # 使用定长双端队列，超出上限时自动淘汰最旧的消息
+        self.context_history = deque(maxlen=short_memory_max_size)
         self.is_active = False
+        # 提示文本缓存：((是否包含长期记忆, 消息ID元组), 格式化结果)
+        self._prompt_cache = None
+        # 预绑定 add_message 热路径上的方法（context_history 只原地修改，不会被替换）
+        self._append_history = self.context_history.append
+        self._memory_add = self.memory_manager.add_message
         
-        logger.info(f"MCPContextManager初始化成功，用户ID: {user_id}")
+        logger.info("MCPContextManager初始化成功，用户ID: %s", user_id)
     
     def __enter__(self):
         """
@@ -74,10 +104,13 @@ class MCPContextManager:
         加载现有的上下文信息
         """
         self.is_active = True
+        # 等待该用户尚未完成的后台写入，确保读到最新的短期记忆
+        self.flush()
         # 加载短期记忆并确保格式统一
         memories = self.memory_manager.get_short_memory(self.user_id)
-        self.context_history = self._normalize_messages_format(memories)
-        logger.info(f"进入上下文，已加载{len(self.context_history)}条短期记忆")
+        self.context_history.clear()
+        self.context_history.extend(self._normalize_messages_format(memories))
+        logger.debug("进入上下文，已加载%d条短期记忆", len(self.context_history))
         return self
     
     def __exit__(self, exc_type, exc_val, exc_tb):
@@ -85,15 +118,74 @@ class MCPContextManager:
         退出上下文管理
         保存上下文信息
         """
-        # 保存短期记忆
+        # 保存短期记忆（提交到后台线程池，立即返回）
         if self.context_history:
-            self.memory_manager.store_short_memory(self.user_id, self.context_history)
-            logger.info(f"退出上下文，已保存{len(self.context_history)}条短期记忆到短期存储")
+            self._submit_short_memory_write(list(self.context_history))
+            logger.debug("退出上下文，已提交%d条短期记忆的后台保存任务", len(self.context_history))
         
         self.is_active = False
         # 如果有异常，返回False让异常继续传播
         return False
     
+    def _submit_short_memory_write(self, messages: List[Dict[str, Any]]) -> Future:
+        """
+        提交短期记忆的后台写入任务
+        同一用户的写入会串联执行，后提交的任务先等待前一个任务完成
+        
+        Args:
+            messages: 需要保存的消息列表快照
+            
+        Returns:
+            Future: 写入任务
+        """
+        user_id = self.user_id
+        with self._pending_lock:
+            previous = self._pending_writes.get(user_id)
+            future = self._IO_POOL.submit(self._store_short_memory_after, previous, messages)
+            self._pending_writes[user_id] = future
+
+        def _cleanup(done: Future):
+            with self._pending_lock:
+                if self._pending_writes.get(user_id) is done:
+                    del self._pending_writes[user_id]
+
+        future.add_done_callback(_cleanup)
+        return future
+
+    def _store_short_memory_after(self, previous: Optional[Future], messages: List[Dict[str, Any]]) -> bool:
+        """
+        在前一个写入任务结束后保存短期记忆
+        """
+        if previous is not None:
+            try:
+                previous.result()
+            except Exception:
+                # 前一次写入失败不影响本次写入
+                pass
+        result = self.memory_manager.store_short_memory(self.user_id, messages)
+        logger.debug("后台保存短期记忆完成，用户ID: %s，条数: %d", self.user_id, len(messages))
+        return result
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        等待当前用户所有已提交的后台写入完成
+        
+        Args:
+            timeout: 最长等待时间（秒），None表示一直等待
+            
+        Returns:
+            bool: 写入是否全部成功（无待完成任务时返回True）
+        """
+        with self._pending_lock:
+            future = self._pending_writes.get(self.user_id)
+        if future is None:
+            return True
+        try:
+            return bool(future.result(timeout=timeout))
+        except Exception as e:
+            logger.error("等待短期记忆后台写入时出错: %s", e)
+            return False
+    
     @contextmanager
     def active_context(self):
         """
@@ -122,43 +214,48 @@ class MCPContextManager:
             bool: 添加是否成功
         """
         try:
+            # 先判断是否需要写入长期记忆，低重要性消息只写短期记忆
+            persist_long = importance_score >= self.memory_manager.long_memory_importance_threshold
+            
             # 确保消息格式正确，强制包含必要字段
             if not isinstance(message, dict):
                 # 尝试从对象获取属性
                 message_dict = {
-                    "message_id": str(uuid.uuid4()),  # 生成唯一ID
+                    "message_id": str(_uuid4()),  # 生成唯一ID
                     "type": getattr(message, "type", "human"),
                     "content": getattr(message, "content", ""),
-                    "timestamp": datetime.now().isoformat(),
+                    "timestamp": _now().isoformat(),
                     "additional_kwargs": getattr(message, "additional_kwargs", {}),
                     "name": getattr(message, "name", None),
                     "importance_score": importance_score
                 }
             else:
-                # 确保包含所有必要字段
+                # 确保包含所有必要字段，ID和时间戳仅在缺失时生成
+                get = message.get
                 message_dict = {
-                    "message_id": message.get("message_id", str(uuid.uuid4())),
-                    "type": message.get("type", "human"),
-                    "content": message.get("content", ""),
-                    "timestamp": message.get("timestamp", datetime.now().isoformat()),
-                    "additional_kwargs": message.get("additional_kwargs", {}),
-                    "name": message.get("name", None),
+                    "message_id": get("message_id") or str(_uuid4()),
+                    "type": get("type", "human"),
+                    "content": get("content", ""),
+                    "timestamp": get("timestamp") or _now().isoformat(),
+                    "additional_kwargs": get("additional_kwargs", {}),
+                    "name": get("name", None),
                     "importance_score": importance_score
                 }
             
             # 添加到上下文历史
-            self.context_history.append(message_dict)
+            self._append_history(message_dict)
+            self._prompt_cache = None
             
             # 调用记忆管理器添加消息
-            result = self.memory_manager.add_message(self.user_id, message_dict, importance_score)
+            result = self._memory_add(self.user_id, message_dict, importance_score, persist_long=persist_long)
             
-            if importance_score >= self.memory_manager.long_memory_importance_threshold:
-                logger.info(f"消息重要性为{importance_score}，已保存到长期记忆")
+            if persist_long:
+                logger.debug("消息重要性为%s，已保存到长期记忆", importance_score)
             
             return result
             
         except Exception as e:
-            logger.error(f"添加消息到上下文时出错: {str(e)}")
+            logger.error("添加消息到上下文时出错: %s", e)
             return False
     
     def add_user_message(self, content: str, importance_score: float = 0.0):
@@ -194,7 +291,7 @@ class MCPContextManager:
             List[Dict[str, Any]]: 上下文消息列表
         """
         # 先获取短期记忆（上下文历史）
-        messages = self.context_history.copy()
+        messages = list(self.context_history)
         
         # 如果需要包含长期记忆
         if include_long_memory:
@@ -207,7 +304,7 @@ class MCPContextManager:
                 all_messages.sort(key=lambda x: x.get('timestamp', datetime.now().isoformat()))
                 messages = all_messages
             except Exception as e:
-                logger.error(f"获取长期记忆时出错: {str(e)}")
+                logger.error("获取长期记忆时出错: %s", e)
         
         # 如果设置了限制，只返回最新的消息
         if limit and len(messages) > limit:
@@ -253,14 +350,14 @@ class MCPContextManager:
                 long_memories = self.memory_manager.get_long_memory(self.user_id)
                 long_memory_count = len(long_memories)
             except Exception as e:
-                logger.error(f"获取长期记忆数量时出错: {str(e)}")
+                logger.error("获取长期记忆数量时出错: %s", e)
             
             return {
                 'short_memory_count': short_memory_count,
                 'long_memory_count': long_memory_count
             }
         except Exception as e:
-            logger.error(f"获取统计信息时出错: {str(e)}")
+            logger.error("获取统计信息时出错: %s", e)
             return {
                 'short_memory_count': len(self.context_history),
                 'long_memory_count': 0
@@ -285,36 +382,22 @@ class MCPContextManager:
             # 如果是字典格式，将其转换为列表
             return [memories]
             
-        # 如果已经是列表格式，确保每个元素都有必要的字段
+        # 如果已经是列表格式，按预定义字段表补齐必要字段
+        schema = self._MSG_SCHEMA
+        now_iso = datetime.now().isoformat()
         normalized_messages = []
         for msg in memories:
-            if isinstance(msg, dict):
-                normalized_msg = {
-                    "message_id": msg.get("message_id", str(uuid.uuid4())),
-                    "type": msg.get("type", "human"),
-                    "content": msg.get("content", ""),
-                    "timestamp": msg.get("timestamp", datetime.now().isoformat()),
-                    "additional_kwargs": msg.get("additional_kwargs", {}),
-                    "name": msg.get("name", None),
-                    "importance_score": msg.get("importance_score", 0.0)
-                }
-                normalized_messages.append(normalized_msg)
-            else:
-                # 尝试从对象获取属性
-                try:
-                    normalized_msg = {
-                        "message_id": str(uuid.uuid4()),
-                        "type": getattr(msg, "type", "human"),
-                        "content": getattr(msg, "content", ""),
-                        "timestamp": datetime.now().isoformat(),
-                        "additional_kwargs": getattr(msg, "additional_kwargs", {}),
-                        "name": getattr(msg, "name", None),
-                        "importance_score": 0.0
-                    }
-                    normalized_messages.append(normalized_msg)
-                except Exception:
-                    # 如果无法从对象获取属性，跳过此消息
-                    continue
+            # 字典与消息对象共用同一套取值逻辑：dict.get / getattr 的调用形式一致
+            get = msg.get if isinstance(msg, dict) else partial(getattr, msg)
+            try:
+                normalized_msg = {key: get(key, default) for key, default in schema}
+                normalized_msg["message_id"] = get("message_id", None) or str(uuid.uuid4())
+                normalized_msg["timestamp"] = get("timestamp", None) or now_iso
+                normalized_msg["additional_kwargs"] = get("additional_kwargs", None) or {}
+            except Exception:
+                # 如果无法从对象获取属性，跳过此消息
+                continue
+            normalized_messages.append(normalized_msg)
                     
         return normalized_messages
     
@@ -371,13 +454,15 @@ class MCPContextManager:
         Returns:
             List[Dict[str, Any]]: 最近的消息列表，每条消息都包含message_id、type、content、timestamp等必要字段
         """
-        recent_messages = self.context_history[-count:] if self.context_history else []
-        return self._normalize_messages_format(recent_messages)
+        # context_history 本身就是定长环形缓冲区，且写入时（__enter__ / add_message）已完成格式化，
+        # 这里直接截取尾部即可，无需再次格式化
+        history_len = len(self.context_history)
+        return list(itertools.islice(self.context_history, max(0, history_len - count), None))
     
     def update_memory_importance(self, message_content: str, importance_score: float):
         """
         更新记忆的重要性分数
-        注意：此方法仅适用于长期记忆
+        注意：此方法仅适用于长期记忆，按内容精确匹配
         
         Args:
             message_content: 消息内容
@@ -387,23 +472,11 @@ class MCPContextManager:
             bool: 更新是否成功
         """
         try:
-            # 搜索包含该内容的长期记忆
-            results = self.long_memory.search_memory(self.user_id, message_content, limit=10)
-            
-            success = False
-            for result in results:
-                # 由于我们没有直接的memory_id，这里需要先获取所有记忆并查找
-                # 注意：实际应用中可能需要更精确的匹配方法
-                if message_content in result.get('content', ''):
-                    # 这里简化处理，实际可能需要额外的查询来获取memory_id
-                    # 或者修改longmemory.py提供按内容更新的方法
-                    logger.warning(f"警告：无法直接更新重要性分数，缺少memory_id")
-                    return False
-            
-            return success
+            # 直接按内容哈希单次UPDATE，无需先搜索再逐条比对
+            return self.memory_manager.update_long_memory_importance(self.user_id, message_content, importance_score)
             
         except Exception as e:
-            logger.error(f"更新记忆重要性时出错: {str(e)}")
+            logger.error("更新记忆重要性时出错: %s", e)
             return False
     
     def clear_short_memory(self):
@@ -414,6 +487,8 @@ class MCPContextManager:
             bool: 清除是否成功
         """
         try:
+            # 先等待后台写入完成，避免清除后又被旧的写入任务覆盖
+            self.flush()
             # 假设记忆管理器有相应方法，否则直接调用底层实例
             if hasattr(self.memory_manager, 'clear_short_memory'):
                 result = self.memory_manager.clear_short_memory(self.user_id)
@@ -421,11 +496,12 @@ class MCPContextManager:
                 # 回退到直接调用底层实例
                 result = self.memory_manager.short_memory.short_memory.delete_memory(self.user_id)
             if result:
-                self.context_history = []
-                logger.info(f"短期记忆已清除")
+                self.context_history.clear()
+                self._prompt_cache = None
+                logger.debug("短期记忆已清除")
             return result
         except Exception as e:
-            logger.error(f"清除短期记忆时出错: {str(e)}")
+            logger.error("清除短期记忆时出错: %s", e)
             return False
     
     def clear_long_memory(self, specific_memory_id: Optional[int] = None):
@@ -446,10 +522,14 @@ class MCPContextManager:
                 # 回退到直接调用底层实例
                 result = self.memory_manager.long_memory.long_memory.delete_memory(self.user_id, specific_memory_id)
             if result:
-                logger.info(f"{f'特定ID({specific_memory_id})的' if specific_memory_id else '用户'}长期记忆已清除")
+                self._prompt_cache = None
+                if specific_memory_id:
+                    logger.debug("特定ID(%s)的长期记忆已清除", specific_memory_id)
+                else:
+                    logger.debug("用户长期记忆已清除")
             return result
         except Exception as e:
-            logger.error(f"清除长期记忆时出错: {str(e)}")
+            logger.error("清除长期记忆时出错: %s", e)
             return False
     
     def format_context_as_prompt(self, include_long_memory: bool = False) -> str:
@@ -463,6 +543,12 @@ class MCPContextManager:
             str: 格式化的提示文本
         """
         context = self.get_context(include_long_memory)
+        
+        # 上下文消息未变化时直接复用上次的格式化结果
+        cache_key = (include_long_memory, tuple(msg.get('message_id') for msg in context))
+        if self._prompt_cache is not None and self._prompt_cache[0] == cache_key:
+            return self._prompt_cache[1]
+        
         prompt_parts = []
         
         if context:
@@ -475,7 +561,9 @@ class MCPContextManager:
             
             prompt_parts.append("")
         
-        return "\n".join(prompt_parts)
+        prompt = "\n".join(prompt_parts)
+        self._prompt_cache = (cache_key, prompt)
+        return prompt
     
     # 已在文件上方定义了正确的get_stats方法，此处移除重复定义
 
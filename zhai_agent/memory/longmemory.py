@@ -4,16 +4,170 @@
 使用PostgreSQL存储和管理长期对话记忆
 """
 import psycopg2
-from psycopg2.extras import DictCursor
+from psycopg2 import errors as pg_errors
+from psycopg2.extras import DictCursor, Json, execute_values
+from psycopg2.pool import ThreadedConnectionPool
+from psycopg2.extensions import connection as PGConnection
+from contextlib import contextmanager
+import io
 import json
 import uuid
+import time
+import threading
 import logging
+from collections import OrderedDict
 from datetime import datetime
 from typing import List, Dict, Any, Optional
 from ..config import settings
+# 尝试导入orjson加速元数据序列化，但不强制要求
+ORJSON_AVAILABLE = False
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    pass
 
 logger = logging.getLogger(__name__)
 
+
+def _dumps_metadata(obj) -> str:
+    """ 序列化元数据为JSON字符串，优先使用orjson """
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(obj).decode()
+    return json.dumps(obj, ensure_ascii=False)
+
+
+def _csv_field(value) -> str:
+    """
+    转换为COPY CSV字段：None写为不加引号的空值（即NULL），其余值一律加引号，
+    带引号的空字符串在CSV格式下不会被当作NULL
+    """
+    if value is None:
+        return ""
+    return '"' + str(value).replace('"', '""') + '"'
+
+
+class FastJson(Json):
+    """ 使用_dumps_metadata序列化的Json适配器 """
+    
+    def dumps(self, obj):
+        return _dumps_metadata(obj)
+
+
+# 单次写入的消息数达到该阈值时改用COPY批量导入
+COPY_BATCH_THRESHOLD = 100
+
+# 连接池大小：归还连接时空闲连接超过 minconn 会被直接关闭，连同其上的预编译语句一起丢失，
+# 因此 minconn 需覆盖并发读写的线程数（记忆读取线程池 4 + 后台写入线程池 4）
+POOL_MIN_CONNECTIONS = 8
+POOL_MAX_CONNECTIONS = 20
+
+# 读取记忆时只取用得到的列，避免传输id等无用字段；
+# metadata只取出用到的字段，timestamp缺失时在数据库端回退为created_at
+MEMORY_COLUMNS = (
+    "message_id, message_type, content, "
+    "metadata->'additional_kwargs' AS additional_kwargs, metadata->>'name' AS name, "
+    "COALESCE(NULLIF(metadata->>'timestamp', ''), "
+    "to_char(created_at, 'YYYY-MM-DD\"T\"HH24:MI:SS.US')) AS effective_ts, "
+    "importance_score"
+)
+
+# 热路径上的预编译语句，每个连接首次使用时PREPARE一次，之后直接EXECUTE
+PREPARED_STATEMENTS = {
+    "get_memory_created": f'''
+        SELECT {MEMORY_COLUMNS} FROM long_term_memory 
+        WHERE user_id = $1 
+        ORDER BY created_at DESC 
+        LIMIT $2
+    ''',
+    "get_memory_importance": f'''
+        SELECT {MEMORY_COLUMNS} FROM long_term_memory 
+        WHERE user_id = $1 
+        ORDER BY importance_score DESC 
+        LIMIT $2
+    ''',
+    "search_memory": f'''
+        SELECT {MEMORY_COLUMNS} FROM long_term_memory 
+        WHERE user_id = $1 
+        AND content ILIKE $2 
+        ORDER BY created_at DESC 
+        LIMIT $3
+    ''',
+    "insert_memory": '''
+        INSERT INTO long_term_memory 
+        (user_id, message_id, message_type, content, metadata, importance_score) 
+        VALUES ($1, $2, $3, $4, $5, $6)
+    ''',
+    "upsert_user": '''
+        INSERT INTO user_ids (user_id) VALUES ($1)
+        ON CONFLICT (user_id) DO UPDATE SET last_updated = CURRENT_TIMESTAMP
+    ''',
+}
+
+# get_memory 各排序方式对应的EXECUTE语句，按order_by直接查表，热路径上不再拼接SQL
+GET_MEMORY_EXECUTE = {
+    "created_at": "EXECUTE get_memory_created (%s, %s)",
+    "importance_score": "EXECUTE get_memory_importance (%s, %s)",
+}
+
+
+# 读缓存配置：最多缓存的查询结果数量及过期时间（秒）
+READ_CACHE_MAXSIZE = 1024
+READ_CACHE_TTL = 10.0
+# list_users 结果的缓存键
+_USERS_CACHE_KEY = ("__users__",)
+
+
+class _TTLCache:
+    """ 带过期时间的线程安全LRU缓存，键的第一个元素为user_id，便于按用户失效 """
+    
+    def __init__(self, maxsize: int = READ_CACHE_MAXSIZE, ttl: float = READ_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+    
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+    
+    def invalidate(self, user_id: Optional[str] = None):
+        """
+        使缓存失效
+        
+        Args:
+            user_id: 仅清除该用户相关的缓存，为None时清空全部
+        """
+        with self._lock:
+            if user_id is None:
+                self._data.clear()
+                return
+            for key in [k for k in self._data if k[0] == user_id]:
+                del self._data[key]
+            # 用户的写入会改变 list_users 的结果与排序
+            self._data.pop(_USERS_CACHE_KEY, None)
+
+
+class PreparedConnection(PGConnection):
+    """ 记录预编译语句是否已在该连接上创建的连接类 """
+    statements_prepared = False
+
+
 class LongMemory:
     """ 使用PostgreSQL实现的长期记忆存储管理器 """
     
@@ -22,7 +176,9 @@ class LongMemory:
                  port: int = None,
                  database: str = None,
                  user: str = None,
-                 password: str = None):
+                 password: str = None,
+                 minconn: int = POOL_MIN_CONNECTIONS,
+                 maxconn: int = POOL_MAX_CONNECTIONS):
         """
         初始化长期记忆管理器
         
@@ -32,35 +188,81 @@ class LongMemory:
             database: 数据库名称
             user: 数据库用户名
             password: 数据库密码
+            minconn: 连接池最小连接数
+            maxconn: 连接池最大连接数
         """
         self.host = host or settings.PG_HOST
         self.port = port or settings.PG_PORT
         self.database = database or settings.PG_DATABASE
         self.user = user or settings.PG_USER
         self.password = password or settings.PG_PASSWORD
+        self._pool = None
+        self._read_cache = _TTLCache()
         try:
-            # 尝试连接PostgreSQL数据库
-            self.conn = psycopg2.connect(
+            # 使用线程安全的连接池，避免所有调用方串行共享同一个连接
+            self._pool = ThreadedConnectionPool(
+                minconn,
+                maxconn,
                 host=self.host,
                 port=self.port,
                 database=self.database,
                 user=self.user,
-                password=self.password
+                password=self.password,
+                connection_factory=PreparedConnection
             )
-            self.cursor = self.conn.cursor(cursor_factory=DictCursor)
             self.is_connected = True
-            logger.info(f"成功连接到PostgreSQL服务器: {host}:{port} 数据库: {database}")
+            logger.info(f"成功连接到PostgreSQL服务器: {self.host}:{self.port} 数据库: {self.database}")
             
             # 创建表结构（如果不存在）
             self._create_tables()
             
         except psycopg2.OperationalError as e:
-            self.conn = None
-            self.cursor = None
+            self._pool = None
             self.is_connected = False
             logger.error(f"无法连接到PostgreSQL服务器: {str(e)}")
             logger.warning("长期记忆功能将不可用")
     
+    @contextmanager
+    def _cursor(self, cursor_factory=DictCursor):
+        """
+        从连接池借出一个连接并返回游标
+        正常结束时提交事务，出错时回滚，最后归还连接
+        
+        Args:
+            cursor_factory: 游标类型，为None时使用返回元组的普通游标
+        
+        Yields:
+            cursor: 数据库游标
+        """
+        conn = self._pool.getconn()
+        try:
+            with conn.cursor(cursor_factory=cursor_factory) as cur:
+                yield cur
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            # 出错后预编译语句状态不确定，下次使用时重新创建
+            conn.statements_prepared = False
+            raise
+        finally:
+            self._pool.putconn(conn)
+    
+    def _ensure_prepared(self, cur):
+        """
+        确保当前连接上已创建预编译语句
+        
+        Args:
+            cur: 数据库游标
+        """
+        conn = cur.connection
+        if conn.statements_prepared:
+            return
+        # 先清理可能残留的同名语句，再统一创建
+        cur.execute("DEALLOCATE ALL")
+        for name, sql in PREPARED_STATEMENTS.items():
+            cur.execute(f"PREPARE {name} AS {sql}")
+        conn.statements_prepared = True
+    
     def _create_tables(self):
         """
         创建必要的数据库表结构
@@ -69,102 +271,92 @@ class LongMemory:
             return
             
         try:
-            # 创建会话表
-            self.cursor.execute('''
-                CREATE TABLE IF NOT EXISTS user_ids (
-                    user_id VARCHAR(255) PRIMARY KEY,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            
-            # 创建记忆表
-            self.cursor.execute('''
-                CREATE TABLE IF NOT EXISTS long_term_memory (
-                    id SERIAL PRIMARY KEY,
-                    message_id VARCHAR(255) NOT NULL,  -- 统一的消息ID
-                    user_id VARCHAR(255) REFERENCES user_ids(user_id),
-                    message_type VARCHAR(50) NOT NULL,  -- 'human' 或 'ai'
-                    content TEXT NOT NULL,
-                    metadata JSONB DEFAULT '{}',
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    importance_score FLOAT DEFAULT 0.0  -- 用于标记重要性
-                )
-            ''')
-            
-            # 创建索引以提高查询性能
-            self.cursor.execute('''
-                CREATE INDEX IF NOT EXISTS idx_memory_user_id 
-                ON long_term_memory(user_id)
-            ''')
-            
-            self.cursor.execute('''
-                CREATE INDEX IF NOT EXISTS idx_memory_created_at 
-                ON long_term_memory(created_at)
-            ''')
-            
-            self.cursor.execute('''
-                CREATE INDEX IF NOT EXISTS idx_memory_importance 
-                ON long_term_memory(importance_score DESC)
-            ''')
-            
-            # 添加message_id索引
-            self.cursor.execute('''
-                CREATE INDEX IF NOT EXISTS idx_memory_message_id 
-                ON long_term_memory(message_id)
-            ''')
-            
-            self.conn.commit()
+            with self._cursor() as cur:
+                # 创建会话表
+                cur.execute('''
+                    CREATE TABLE IF NOT EXISTS user_ids (
+                        user_id VARCHAR(255) PRIMARY KEY,
+                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    )
+                ''')
+            
+                # 创建记忆表
+                cur.execute('''
+                    CREATE TABLE IF NOT EXISTS long_term_memory (
+                        id SERIAL PRIMARY KEY,
+                        message_id VARCHAR(255) NOT NULL,  -- 统一的消息ID
+                        user_id VARCHAR(255) REFERENCES user_ids(user_id),
+                        message_type VARCHAR(50) NOT NULL,  -- 'human' 或 'ai'
+                        content TEXT NOT NULL,
+                        metadata JSONB DEFAULT '{}',
+                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        importance_score FLOAT DEFAULT 0.0  -- 用于标记重要性
+                    )
+                ''')
+            
+                # 创建复合索引：按用户过滤后直接按时间/重要性有序扫描，LIMIT无需额外排序
+                cur.execute('''
+                    CREATE INDEX IF NOT EXISTS idx_memory_user_created 
+                    ON long_term_memory(user_id, created_at DESC)
+                ''')
+            
+                cur.execute('''
+                    CREATE INDEX IF NOT EXISTS idx_memory_user_importance 
+                    ON long_term_memory(user_id, importance_score DESC)
+                ''')
+            
+                # 旧的单列索引已被上面的复合索引覆盖
+                cur.execute('DROP INDEX IF EXISTS idx_memory_user_id')
+                cur.execute('DROP INDEX IF EXISTS idx_memory_created_at')
+                cur.execute('DROP INDEX IF EXISTS idx_memory_importance')
+            
+                # 添加message_id索引
+                cur.execute('''
+                    CREATE INDEX IF NOT EXISTS idx_memory_message_id 
+                    ON long_term_memory(message_id)
+                ''')
+            
+                # 按内容哈希精确定位记忆（用于按内容更新重要性）
+                cur.execute('''
+                    CREATE INDEX IF NOT EXISTS idx_memory_user_content_md5 
+                    ON long_term_memory(user_id, md5(content))
+                ''')
+            
             logger.info("数据库表结构创建成功")
             
         except Exception as e:
-            self.conn.rollback()
             logger.error(f"创建数据库表结构时出错: {str(e)}")
+        
+        # 单独事务创建三元组索引：扩展可能因权限不足创建失败，不影响上面的表结构
+        try:
+            with self._cursor() as cur:
+                cur.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+                # 让 content ILIKE '%关键词%' 走GIN索引而不是全表扫描
+                cur.execute('''
+                    CREATE INDEX IF NOT EXISTS idx_memory_content_trgm 
+                    ON long_term_memory USING GIN (content gin_trgm_ops)
+                ''')
+        except Exception as e:
+            logger.warning(f"创建内容三元组索引失败，内容搜索将使用顺序扫描: {str(e)}")
     
-    def _ensure_user_exists(self, user_id: str):
+    def _ensure_user_exists(self, cur, user_id: str):
         """
         确保用户记录存在
+        与调用方共用同一个游标，使其和后续写入处于同一事务中
         
         Args:
+            cur: 数据库游标
             user_id: 用户标识符
         """
-        if not self.is_connected:
-            return
-            
-        try:
-            # 检查表是否存在，如果不存在则创建
-            self.cursor.execute("""
-                CREATE TABLE IF NOT EXISTS user_ids (
-                    user_id VARCHAR(255) PRIMARY KEY,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
-            
-            # 检查用户是否存在
-            self.cursor.execute(
-                "SELECT user_id FROM user_ids WHERE user_id = %s",
-                (user_id,)
-            )
-            
-            if not self.cursor.fetchone():
-                # 用户不存在，创建新用户
-                self.cursor.execute(
-                    "INSERT INTO user_ids (user_id) VALUES (%s)",
-                    (user_id,)
-                )
-            else:
-                # 更新用户的最后更新时间
-                self.cursor.execute(
-                    "UPDATE user_ids SET last_updated = CURRENT_TIMESTAMP WHERE user_id = %s",
-                    (user_id,)
-                )
-            
-            self.conn.commit()
-            
-        except Exception as e:
-            self.conn.rollback()
-            logger.error(f"确保用户存在时出错: {str(e)}")
+        # 单条UPSERT：不存在则插入，存在则更新最后更新时间（表结构已由_create_tables创建）
+        cur.execute(
+            """
+            INSERT INTO user_ids (user_id) VALUES (%s)
+            ON CONFLICT (user_id) DO UPDATE SET last_updated = CURRENT_TIMESTAMP
+            """,
+            (user_id,)
+        )
     
     def store_memory(self, user_id: str, messages: List[Dict[str, Any]], importance_score: float = 0.0):
         """
@@ -182,53 +374,131 @@ class LongMemory:
             return False
             
         try:
-            # 确保用户存在
-            self._ensure_user_exists(user_id)
-            
-            # 存储消息
-            for msg in messages:
-                # 确保消息是字典格式并包含所有必要字段
-                if isinstance(msg, dict):
-                    message_type = msg.get("type", "human")
-                    content = msg.get("content", "")
-                    message_id = msg.get("message_id", str(uuid.uuid4()))
-                    timestamp = msg.get("timestamp", datetime.now().isoformat())
-                    # 使用消息中指定的重要性分数，如果没有则使用默认值
-                    msg_importance_score = msg.get("importance_score", importance_score)
-                    metadata = {
-                        "additional_kwargs": msg.get("additional_kwargs", {}),
-                        "name": msg.get("name", None),
-                        "timestamp": timestamp  # 存储timestamp到metadata中
-                    }
-                else:
-                    # 尝试从对象获取属性
-                    message_type = getattr(msg, "type", "human")
-                    content = getattr(msg, "content", "")
-                    message_id = str(uuid.uuid4())
-                    timestamp = datetime.now().isoformat()
-                    msg_importance_score = importance_score
-                    metadata = {
-                        "additional_kwargs": getattr(msg, "additional_kwargs", {}),
-                        "name": getattr(msg, "name", None),
-                        "timestamp": timestamp
-                    }
-                
-                # 插入记忆
-                self.cursor.execute('''
-                    INSERT INTO long_term_memory 
-                    (user_id, message_id, message_type, content, metadata, importance_score) 
-                    VALUES (%s, %s, %s, %s, %s, %s)
-                ''', (user_id, message_id, message_type, content, json.dumps(metadata), msg_importance_score))
-            
-            self.conn.commit()
+            rows = self._build_rows(user_id, messages, importance_score)
+            try:
+                self._store_rows(user_id, rows)
+            except pg_errors.UndefinedTable:
+                # 表只在连接时创建一次；若运行期间被删除，重建后重试一次
+                logger.warning("长期记忆表不存在，重新创建后重试写入")
+                self._create_tables()
+                self._store_rows(user_id, rows)
+            
+            self._read_cache.invalidate(user_id)
             logger.info(f"成功将用户记忆存储到PostgreSQL: {user_id}")
             return True
             
         except Exception as e:
-            self.conn.rollback()
             logger.error(f"存储长期记忆时出错: {str(e)}")
             return False
     
+    def _store_rows(self, user_id: str, rows: List[tuple]):
+        """
+        在一个事务中确保用户存在并写入单个用户的记忆行
+        
+        Args:
+            user_id: 用户标识符
+            rows: _build_rows 生成的行数据
+        """
+        with self._cursor() as cur:
+            if len(rows) == 1:
+                # 单条消息（最常见的add_message路径）：用户UPSERT与插入合并为一次往返发送
+                self._ensure_prepared(cur)
+                row = rows[0]
+                cur.execute(
+                    "EXECUTE upsert_user (%s); EXECUTE insert_memory (%s, %s, %s, %s, %s, %s)",
+                    (user_id,) + row[:4] + (FastJson(row[4]), row[5])
+                )
+            else:
+                # 确保用户存在
+                self._ensure_user_exists(cur, user_id)
+                self._write_rows(cur, rows)
+    
+    def _build_rows(self, user_id: str, messages: List[Dict[str, Any]], importance_score: float = 0.0) -> List[tuple]:
+        """
+        将消息转换为待写入的行数据，确保包含所有必要字段
+        
+        Args:
+            user_id: 用户标识符
+            messages: 消息列表
+            importance_score: 消息未指定重要性分数时使用的默认值
+            
+        Returns:
+            List[tuple]: (user_id, message_id, message_type, content, metadata, importance_score) 元组列表
+        """
+        rows = []
+        for msg in messages:
+            # 确保消息是字典格式并包含所有必要字段
+            if isinstance(msg, dict):
+                message_type = msg.get("type", "human")
+                content = msg.get("content", "")
+                message_id = msg.get("message_id") or str(uuid.uuid4())
+                timestamp = msg.get("timestamp") or datetime.now().isoformat()
+                # 使用消息中指定的重要性分数，如果没有则使用默认值
+                msg_importance_score = msg.get("importance_score", importance_score)
+                metadata = {
+                    "additional_kwargs": msg.get("additional_kwargs", {}),
+                    "name": msg.get("name", None),
+                    "timestamp": timestamp  # 存储timestamp到metadata中
+                }
+            else:
+                # 尝试从对象获取属性
+                message_type = getattr(msg, "type", "human")
+                content = getattr(msg, "content", "")
+                message_id = str(uuid.uuid4())
+                timestamp = datetime.now().isoformat()
+                msg_importance_score = importance_score
+                metadata = {
+                    "additional_kwargs": getattr(msg, "additional_kwargs", {}),
+                    "name": getattr(msg, "name", None),
+                    "timestamp": timestamp
+                }
+            rows.append((user_id, message_id, message_type, content, metadata, msg_importance_score))
+        return rows
+    
+    def _write_rows(self, cur, rows: List[tuple]):
+        """
+        按行数选择写入方式：大批量走COPY，其余使用多行INSERT（单条消息由 _store_rows 走预编译语句）
+        
+        Args:
+            cur: 数据库游标
+            rows: _build_rows 生成的行数据
+        """
+        if len(rows) >= COPY_BATCH_THRESHOLD:
+            # 大批量导入走COPY快速路径
+            self._copy_rows(cur, rows)
+        elif rows:
+            # 多行INSERT一次写入，避免逐条execute带来的往返开销
+            execute_values(
+                cur,
+                '''
+                INSERT INTO long_term_memory 
+                (user_id, message_id, message_type, content, metadata, importance_score) 
+                VALUES %s
+                ''',
+                [row[:4] + (FastJson(row[4]), row[5]) for row in rows],
+                page_size=500
+            )
+    
+    def _copy_rows(self, cur, rows: List[tuple]):
+        """
+        使用COPY批量写入记忆行，适用于初始导入、回填等大批量场景
+        
+        Args:
+            cur: 数据库游标
+            rows: (user_id, message_id, message_type, content, metadata, importance_score) 元组列表
+        """
+        buf = io.StringIO()
+        for user_id, message_id, message_type, content, metadata, score in rows:
+            buf.write(",".join(map(_csv_field, (user_id, message_id, message_type, content,
+                                                _dumps_metadata(metadata), score))))
+            buf.write("\n")
+        buf.seek(0)
+        cur.copy_expert(
+            "COPY long_term_memory (user_id, message_id, message_type, content, metadata, importance_score) "
+            "FROM STDIN WITH (FORMAT csv)",
+            buf
+        )
+    
     def add_message(self, user_id: str, message: Dict[str, Any], importance_score: float = 0.0):
         """
         添加单条消息到长期记忆
@@ -258,50 +528,65 @@ class LongMemory:
         if not self.is_connected:
             return []
             
+        # 验证排序参数，非法值回退为按时间排序
+        if order_by not in GET_MEMORY_EXECUTE:
+            order_by = 'created_at'
+        
+        # 优先命中读缓存，返回副本避免调用方修改缓存内容
+        cache_key = (user_id, limit, order_by)
+        cached = self._read_cache.get(cache_key)
+        if cached is not None:
+            return [dict(memory) for memory in cached]
+            
         try:
-            # 验证排序参数
-            if order_by not in ['created_at', 'importance_score']:
-                order_by = 'created_at'
-            
-            # 构建查询
-            query = f'''
-                SELECT * FROM long_term_memory 
-                WHERE user_id = %s 
-                ORDER BY {order_by} DESC 
-                LIMIT %s
-            '''
-            
-            self.cursor.execute(query, (user_id, limit))
-            rows = self.cursor.fetchall()
-            
-            # 转换为字典列表，确保包含所有必要字段
-            memories = []
-            for row in rows:
-                # 从metadata中获取timestamp，如果没有则使用数据库中的created_at
-                metadata_timestamp = row['metadata'].get('timestamp') if isinstance(row['metadata'], dict) else None
-                timestamp = metadata_timestamp if metadata_timestamp else (row['created_at'].isoformat() if row['created_at'] else datetime.now().isoformat())
-                
-                memory = {
-                    'message_id': row.get('message_id', str(uuid.uuid4())),  # 确保有message_id
-                    'type': row['message_type'],
-                    'content': row['content'],
-                    'timestamp': timestamp,
-                    'additional_kwargs': row['metadata'].get('additional_kwargs', {}) if isinstance(row['metadata'], dict) else {},
-                    'name': row['metadata'].get('name', None) if isinstance(row['metadata'], dict) else None,
-                    'importance_score': row['importance_score']
-                }
-                memories.append(memory)
+            with self._cursor(cursor_factory=None) as cur:
+                # 使用预编译语句查询
+                self._ensure_prepared(cur)
+                cur.execute(GET_MEMORY_EXECUTE[order_by], (user_id, limit))
+                rows = cur.fetchall()
             
-            # 如果按时间排序，反转列表使其按时间正序返回
-            if order_by == 'created_at':
-                memories.reverse()
+                # 按时间排序时数据库按DESC取出最新的limit条，这里逆序遍历直接得到时间正序的列表
+                if order_by == 'created_at':
+                    rows = reversed(rows)
+                # 转换为字典列表，确保包含所有必要字段
+                memories = self._rows_to_memories(rows)
             
-            return memories
+            self._read_cache.set(cache_key, memories)
+            return [dict(memory) for memory in memories]
             
         except Exception as e:
             logger.error(f"获取长期记忆时出错: {str(e)}")
             return []
     
+    @staticmethod
+    def _rows_to_memories(rows) -> List[Dict[str, Any]]:
+        """
+        将按MEMORY_COLUMNS顺序查询出的元组行转换为统一格式的消息字典
+        
+        Args:
+            rows: 查询结果行
+            
+        Returns:
+            List[Dict]: 消息列表
+        """
+        memories = []
+        now_iso = None
+        for message_id, message_type, content, additional_kwargs, name, timestamp, score in rows:
+            # timestamp已在SQL中回退为created_at，只有两者都为空时才使用当前时间
+            if timestamp is None:
+                now_iso = now_iso or datetime.now().isoformat()
+                timestamp = now_iso
+            memories.append({
+                'message_id': message_id or str(uuid.uuid4()),  # 确保有message_id
+                'type': message_type,
+                'content': content,
+                'timestamp': timestamp,
+                'additional_kwargs': {} if additional_kwargs is None else additional_kwargs,
+                'name': name,
+                'importance_score': score
+            })
+        return memories
+    
     def search_memory(self, user_id: str, query: str, limit: int = 20):
         """
         基于内容搜索长期记忆，确保返回的消息格式统一
@@ -318,36 +603,17 @@ class LongMemory:
             return []
             
         try:
-            # 使用PostgreSQL的全文搜索功能
-            self.cursor.execute('''
-                SELECT * FROM long_term_memory 
-                WHERE user_id = %s 
-                AND content ILIKE %s 
-                ORDER BY created_at DESC 
-                LIMIT %s
-            ''', (user_id, f'%{query}%', limit))
-            
-            rows = self.cursor.fetchall()
-            
-            # 转换为字典列表，确保包含所有必要字段
-            memories = []
-            for row in rows:
-                # 从metadata中获取timestamp，如果没有则使用数据库中的created_at
-                metadata_timestamp = row['metadata'].get('timestamp') if isinstance(row['metadata'], dict) else None
-                timestamp = metadata_timestamp if metadata_timestamp else (row['created_at'].isoformat() if row['created_at'] else datetime.now().isoformat())
-                
-                memory = {
-                    'message_id': row.get('message_id', str(uuid.uuid4())),  # 确保有message_id
-                    'type': row['message_type'],
-                    'content': row['content'],
-                    'timestamp': timestamp,
-                    'additional_kwargs': row['metadata'].get('additional_kwargs', {}) if isinstance(row['metadata'], dict) else {},
-                    'name': row['metadata'].get('name', None) if isinstance(row['metadata'], dict) else None,
-                    'importance_score': row['importance_score']
-                }
-                memories.append(memory)
+            with self._cursor(cursor_factory=None) as cur:
+                # 使用预编译语句进行内容匹配搜索
+                self._ensure_prepared(cur)
+                cur.execute("EXECUTE search_memory (%s, %s, %s)", (user_id, f'%{query}%', limit))
             
-            return memories
+                rows = cur.fetchall()
+            
+                # 转换为字典列表，确保包含所有必要字段
+                memories = self._rows_to_memories(rows)
+            
+                return memories
             
         except Exception as e:
             logger.error(f"搜索长期记忆时出错: {str(e)}")
@@ -368,18 +634,52 @@ class LongMemory:
             return False
             
         try:
-            self.cursor.execute(
-                "UPDATE long_term_memory SET importance_score = %s WHERE id = %s",
-                (importance_score, memory_id)
-            )
-            self.conn.commit()
-            return self.cursor.rowcount > 0
+            with self._cursor() as cur:
+                cur.execute(
+                    "UPDATE long_term_memory SET importance_score = %s WHERE id = %s",
+                    (importance_score, memory_id)
+                )
+                updated = cur.rowcount > 0
+            # 仅凭memory_id无法确定所属用户，清空全部读缓存
+            self._read_cache.invalidate()
+            return updated
             
         except Exception as e:
-            self.conn.rollback()
             logger.error(f"更新记忆重要性时出错: {str(e)}")
             return False
     
+    def update_importance_by_content(self, user_id: str, content: str, importance_score: float) -> List[int]:
+        """
+        按消息内容更新记忆的重要性分数
+        通过 (user_id, md5(content)) 索引单次UPDATE完成，无需先查询memory_id
+        
+        Args:
+            user_id: 用户标识符
+            content: 消息内容（精确匹配）
+            importance_score: 新的重要性分数
+            
+        Returns:
+            List[int]: 被更新的记忆ID列表
+        """
+        if not self.is_connected:
+            return []
+            
+        try:
+            with self._cursor() as cur:
+                cur.execute('''
+                    UPDATE long_term_memory 
+                    SET importance_score = %s 
+                    WHERE user_id = %s AND md5(content) = md5(%s) 
+                    RETURNING id
+                ''', (importance_score, user_id, content))
+                updated_ids = [row['id'] for row in cur.fetchall()]
+            self._read_cache.invalidate(user_id)
+            return updated_ids
+            
+        except Exception as e:
+            logger.error(f"按内容更新记忆重要性时出错: {str(e)}")
+            return []
+    
     def delete_memory(self, user_id: str, memory_id: int = None):
         """
         删除长期记忆
@@ -395,24 +695,24 @@ class LongMemory:
             return False
             
         try:
-            if memory_id:
-                # 删除特定记忆
-                self.cursor.execute(
-                    "DELETE FROM long_term_memory WHERE user_id = %s AND id = %s",
-                    (user_id, memory_id)
-                )
-            else:
-                # 删除整个用户的记忆
-                self.cursor.execute(
-                    "DELETE FROM long_term_memory WHERE user_id = %s",
-                    (user_id,)
-                )
+            with self._cursor() as cur:
+                if memory_id:
+                    # 删除特定记忆
+                    cur.execute(
+                        "DELETE FROM long_term_memory WHERE user_id = %s AND id = %s",
+                        (user_id, memory_id)
+                    )
+                else:
+                    # 删除整个用户的记忆
+                    cur.execute(
+                        "DELETE FROM long_term_memory WHERE user_id = %s",
+                        (user_id,)
+                    )
             
-            self.conn.commit()
+            self._read_cache.invalidate(user_id)
             return True
             
         except Exception as e:
-            self.conn.rollback()
             logger.error(f"删除长期记忆时出错: {str(e)}")
             return False
     
@@ -426,12 +726,16 @@ class LongMemory:
         if not self.is_connected:
             return []
             
+        cached = self._read_cache.get(_USERS_CACHE_KEY)
+        if cached is not None:
+            return list(cached)
+            
         try:
-            self.cursor.execute(
-                "SELECT user_id FROM user_ids ORDER BY last_updated DESC"
-            )
-            rows = self.cursor.fetchall()
-            return [row['user_id'] for row in rows]
+            with self._cursor(cursor_factory=None) as cur:
+                cur.execute("SELECT user_id FROM user_ids ORDER BY last_updated DESC")
+                users = [user_id for (user_id,) in cur.fetchall()]
+            self._read_cache.set(_USERS_CACHE_KEY, users)
+            return list(users)
             
         except Exception as e:
             logger.error(f"列出用户时出错: {str(e)}")
@@ -441,17 +745,24 @@ class LongMemory:
         """
         关闭数据库连接
         """
-        if self.cursor:
-            self.cursor.close()
-        if self.conn:
-            self.conn.close()
+        if self._pool:
+            self._pool.closeall()
+            self._pool = None
         self.is_connected = False
         logger.info("PostgreSQL连接已关闭")
 
 
 # 全局实例管理
+_instance = None
+_instance_lock = threading.Lock()
+
+
 def get_longmemory_instance(**kwargs):
-    if not hasattr(get_longmemory_instance, '_instance'):
-        # 参数将由 __init__ 中的逻辑处理，自动回退到 settings
-        get_longmemory_instance._instance = LongMemory(**kwargs)
-    return get_longmemory_instance._instance
+    global _instance
+    if _instance is None:
+        # 加锁后再次检查，避免多个线程同时初始化创建出多个连接池
+        with _instance_lock:
+            if _instance is None:
+                # 参数将由 __init__ 中的逻辑处理，自动回退到 settings
+                _instance = LongMemory(**kwargs)
+    return _instance
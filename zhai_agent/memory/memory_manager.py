@@ -5,6 +5,13 @@
 """
 from typing import List, Dict, Any, Optional
 from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from heapq import merge
+from operator import itemgetter
+
+
+# 短期/长期记忆并发读写共用的线程池，使两次网络往返的延迟重叠
+_FETCH_POOL = ThreadPoolExecutor(max_workers=4, thread_name_prefix="memory-fetch")
 
 
 class MemoryBackend(ABC):
@@ -48,7 +55,8 @@ class ShortTermMemoryBackend(MemoryBackend):
     def search_memory(self, user_id: str, query: str, limit: int = 10) -> List[Dict[str, Any]]:
         # 短期记忆通常不支持复杂搜索，这里简单实现
         memories = self.get_memory(user_id, limit)
-        return [msg for msg in memories if query.lower() in msg.get('content', '').lower()][:limit]
+        query_lower = query.lower()
+        return [msg for msg in memories if query_lower in (msg.get('content') or '').lower()][:limit]
 
 
 class LongTermMemoryBackend(MemoryBackend):
@@ -68,6 +76,9 @@ class LongTermMemoryBackend(MemoryBackend):
     
     def search_memory(self, user_id: str, query: str, limit: int = 10) -> List[Dict[str, Any]]:
         return self.long_memory.search_memory(user_id, query, limit)
+    
+    def update_importance(self, user_id: str, content: str, importance_score: float) -> List[int]:
+        return self.long_memory.update_importance_by_content(user_id, content, importance_score)
 
 
 class MemoryManager:
@@ -88,7 +99,8 @@ class MemoryManager:
         self.long_memory = long_memory_backend
         self.long_memory_importance_threshold = 0.5
     
-    def add_message(self, user_id: str, message: Dict[str, Any], importance_score: float = 0.0) -> bool:
+    def add_message(self, user_id: str, message: Dict[str, Any], importance_score: float = 0.0,
+                    persist_long: Optional[bool] = None) -> bool:
         """
         添加消息到记忆系统
         
@@ -96,17 +108,22 @@ class MemoryManager:
             user_id: 用户ID
             message: 消息内容
             importance_score: 重要性分数
+            persist_long: 是否写入长期记忆，为None时按重要性阈值判断
             
         Returns:
             bool: 是否添加成功
         """
-        # 始终添加到短期记忆
-        short_result = self.short_memory.add_memory(user_id, message, importance_score)
+        # 根据重要性决定是否添加到长期记忆，低于阈值时完全跳过长期记忆的序列化和写入
+        if persist_long is None:
+            persist_long = importance_score >= self.long_memory_importance_threshold
+        if not persist_long:
+            # 只写短期记忆
+            return self.short_memory.add_memory(user_id, message, importance_score)
         
-        # 根据重要性决定是否添加到长期记忆
-        long_result = True
-        if importance_score >= self.long_memory_importance_threshold:
-            long_result = self.long_memory.add_memory(user_id, message, importance_score)
+        # 长期记忆写入提交到线程池，与短期记忆写入并发执行，使两次往返的延迟重叠
+        long_future = _FETCH_POOL.submit(self.long_memory.add_memory, user_id, message, importance_score)
+        short_result = self.short_memory.add_memory(user_id, message, importance_score)
+        long_result = long_future.result()
         
         return short_result and long_result
     
@@ -122,24 +139,53 @@ class MemoryManager:
         Returns:
             List[Dict[str, Any]]: 消息列表
         """
-        # 获取短期记忆
-        context = self.short_memory.get_memory(user_id, limit)
-        
         if include_long_memory:
-            # 获取长期记忆
-            long_memories = self.long_memory.get_memory(user_id, limit)
+            # 并发获取短期记忆和长期记忆，总耗时约等于较慢的一方
+            long_future = _FETCH_POOL.submit(self.long_memory.get_memory, user_id, limit)
+            short_memories = self.short_memory.get_memory(user_id, limit)
+            long_memories = long_future.result()
             
-            # 合并并去重
-            existing_ids = {msg.get('message_id', '') for msg in context}
-            for mem in long_memories:
-                if mem.get('message_id', '') not in existing_ids:
-                    context.append(mem)
-                    existing_ids.add(mem.get('message_id', ''))
+            # 两路结果各自已按时间正序排列：从最新的一端线性归并，
+            # 按message_id去重，凑够limit条即停止，避免整体排序
+            newest_first = merge(
+                reversed(self._with_sort_key(short_memories)),
+                reversed(self._with_sort_key(long_memories)),
+                key=itemgetter(0),
+                reverse=True
+            )
+            context = []
+            existing_ids = set()
+            for _, mem in newest_first:
+                # 没有message_id的消息无法判重，直接保留
+                message_id = mem.get('message_id')
+                if message_id is not None:
+                    if message_id in existing_ids:
+                        continue
+                    existing_ids.add(message_id)
+                context.append(mem)
+                if len(context) >= limit:
+                    break
+            context.reverse()
+            return context
         
-        # 按时间排序并限制数量
+        # 获取短期记忆，按时间排序并限制数量
+        context = self.short_memory.get_memory(user_id, limit)
         context.sort(key=lambda x: x.get('timestamp', ''), reverse=False)
         return context[-limit:]
     
+    @staticmethod
+    def _with_sort_key(memories: List[Dict[str, Any]]) -> List[tuple]:
+        """
+        预先取出每条记忆的时间戳作为排序键，归并时不再逐次调用 .get
+        
+        Args:
+            memories: 按时间正序排列的消息列表
+            
+        Returns:
+            List[tuple]: (timestamp, 消息) 元组列表
+        """
+        return [(mem.get('timestamp') or '', mem) for mem in memories]
+    
     def search_memory(self, user_id: str, query: str, limit: int = 10) -> List[Dict[str, Any]]:
         """
         搜索记忆
@@ -152,20 +198,23 @@ class MemoryManager:
         Returns:
             List[Dict[str, Any]]: 匹配的消息列表
         """
-        # 搜索短期记忆
+        # 并发搜索短期记忆和长期记忆
+        long_future = _FETCH_POOL.submit(self.long_memory.search_memory, user_id, query, limit)
         short_results = self.short_memory.search_memory(user_id, query, limit)
+        long_results = long_future.result()
         
-        # 搜索长期记忆
-        long_results = self.long_memory.search_memory(user_id, query, limit)
-        
-        # 合并结果并去重
+        # 合并结果并去重，每条消息只取一次message_id
         combined_results = short_results.copy()
-        existing_ids = {msg.get('message_id', '') for msg in short_results}
+        existing_ids = {msg.get('message_id') for msg in short_results}
+        existing_ids.discard(None)
         
         for result in long_results:
-            if result.get('message_id', '') not in existing_ids:
+            message_id = result.get('message_id')
+            if message_id is None:
                 combined_results.append(result)
-                existing_ids.add(result.get('message_id', ''))
+            elif message_id not in existing_ids:
+                combined_results.append(result)
+                existing_ids.add(message_id)
         
         # 按时间排序并限制数量
         combined_results.sort(key=lambda x: x.get('timestamp', ''), reverse=True)
@@ -213,6 +262,20 @@ class MemoryManager:
                     success = False
             return success
     
+    def update_long_memory_importance(self, user_id: str, content: str, importance_score: float) -> bool:
+        """
+        按内容更新长期记忆的重要性分数
+        
+        Args:
+            user_id: 用户ID
+            content: 消息内容
+            importance_score: 新的重要性分数
+            
+        Returns:
+            bool: 是否有记忆被更新
+        """
+        return bool(self.long_memory.update_importance(user_id, content, importance_score))
+    
     def get_long_memory(self, user_id: str) -> List[Dict[str, Any]]:
         """
         获取长期记忆
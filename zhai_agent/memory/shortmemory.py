@@ -5,13 +5,156 @@
 """
 import json
 import redis
+import msgspec
 import uuid
 import logging
-from typing import List, Dict, Any, Optional
+import threading
+from collections import deque
+from functools import partial
+from typing import List, Dict, Any, Optional, Deque
 from datetime import datetime
 
+# 尝试导入orjson加速旧格式json数据的解析，但不强制要求
+ORJSON_AVAILABLE = False
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    pass
+
 logger = logging.getLogger(__name__)
 
+class MemoryMessage(msgspec.Struct, kw_only=True):
+    """ 短期记忆中的一条消息，序列化为msgpack映射，与按字典存储的消息兼容 """
+    message_id: Optional[str] = None
+    type: str = "human"
+    content: Any = ""
+    timestamp: Optional[str] = None
+    additional_kwargs: Dict[str, Any] = {}
+    name: Optional[str] = None
+    importance_score: float = 0.0
+
+
+def _normalize_message(msg, importance_score: Optional[float] = None) -> MemoryMessage:
+    """
+    将字典或消息对象统一转换为MemoryMessage，确保包含所有必要字段
+    
+    Args:
+        msg: 消息字典或带有type、content等属性的消息对象
+        importance_score: 指定时覆盖消息自身的重要性分数
+        
+    Returns:
+        MemoryMessage: 规范化后的消息
+    """
+    if isinstance(msg, MemoryMessage):
+        # 已规范化的消息
+        if importance_score is None:
+            return msg
+        return msgspec.structs.replace(msg, importance_score=importance_score)
+    # 字典与消息对象共用同一取值函数，只做一次类型判断
+    get = msg.get if isinstance(msg, dict) else partial(getattr, msg)
+    if importance_score is None:
+        importance_score = get("importance_score", 0.0)
+    # 缺失时才生成message_id和timestamp：get的默认值参数总会被求值
+    return MemoryMessage(
+        message_id=get("message_id", None) or str(uuid.uuid4()),
+        type=get("type", "human"),
+        content=get("content", ""),
+        timestamp=get("timestamp", None) or datetime.now().isoformat(),
+        additional_kwargs=get("additional_kwargs", None) or {},
+        name=get("name", None),
+        importance_score=importance_score
+    )
+
+# 消息使用msgpack序列化，比json更快且体积更小，中文内容无需转义
+_ENCODER = msgspec.msgpack.Encoder()
+_MESSAGE_DECODER = msgspec.msgpack.Decoder(MemoryMessage)
+_LEGACY_MESSAGE_DECODER = msgspec.msgpack.Decoder(Dict[str, Any])
+_DECODER = msgspec.msgpack.Decoder(List[Dict[str, Any]])
+
+# 写入的每条消息以该版本字节开头，表示已按MemoryMessage规范化，读取时无需再次规范化
+SCHEMA_VERSION = 2
+_SCHEMA_PREFIX = bytes([SCHEMA_VERSION])
+
+
+def _encode_message(message: MemoryMessage) -> bytes:
+    """ 序列化单条消息，作为Redis列表中的一个元素 """
+    return _SCHEMA_PREFIX + _ENCODER.encode(message)
+
+
+def _decode_message(data: bytes) -> MemoryMessage:
+    """
+    反序列化Redis列表中的单条消息
+    带版本前缀的消息直接解码为MemoryMessage，没有前缀的旧数据按字典解码后再规范化
+    
+    Args:
+        data: 序列化后的消息
+        
+    Returns:
+        MemoryMessage: 消息
+    """
+    if data[:1] == _SCHEMA_PREFIX:
+        return _MESSAGE_DECODER.decode(memoryview(data)[1:])
+    return _normalize_message(_LEGACY_MESSAGE_DECODER.decode(data))
+
+
+def _decode_messages(data) -> List[Dict[str, Any]]:
+    """
+    反序列化整体存储的消息列表，用于读取升级前以单个字符串值保存的旧数据
+    
+    Args:
+        data: Redis或内存存储中读取的原始值
+        
+    Returns:
+        List[Dict[str, Any]]: 消息列表
+    """
+    if isinstance(data, str) or data[:1] == b"[":
+        return orjson.loads(data) if ORJSON_AVAILABLE else json.loads(data)
+    return _DECODER.decode(data)
+
+
+# 连接池配置：每个池的最大连接数及连接耗尽时的等待时间（秒）
+POOL_MAX_CONNECTIONS = 32
+POOL_TIMEOUT = 20
+# list_users 每次SCAN请求的键数量提示
+SCAN_COUNT = 1000
+
+# 按连接参数共享的连接池，避免每个ShortMemory实例各自建立连接
+_POOLS: Dict[tuple, redis.BlockingConnectionPool] = {}
+_POOLS_LOCK = threading.Lock()
+
+
+def _get_connection_pool(host: str, port: int, db: int, password: Optional[str]) -> redis.BlockingConnectionPool:
+    """
+    获取指定连接参数对应的共享连接池，不存在时创建
+    
+    Args:
+        host: Redis主机地址
+        port: Redis端口号
+        db: 数据库编号
+        password: 密码
+        
+    Returns:
+        redis.BlockingConnectionPool: 连接池
+    """
+    pool_key = (host, port, db, password)
+    with _POOLS_LOCK:
+        pool = _POOLS.get(pool_key)
+        if pool is None:
+            pool = redis.BlockingConnectionPool(
+                host=host,
+                port=port,
+                db=db,
+                password=password,
+                max_connections=POOL_MAX_CONNECTIONS,
+                timeout=POOL_TIMEOUT,
+                socket_keepalive=True,
+                # 值为msgpack二进制数据，不做字符串解码
+                decode_responses=False
+            )
+            _POOLS[pool_key] = pool
+        return pool
+
 
 class ShortMemory:
     """ 使用Redis实现的短期记忆存储管理器 """
@@ -24,13 +167,9 @@ class ShortMemory:
                  memory_ttl: int = 3600,
                  max_memory_size: int = 10):
         try:
-            # 尝试连接Redis服务器
+            # 尝试连接Redis服务器，使用按连接参数共享的连接池
             self.redis_client = redis.Redis(
-                host=host,
-                port=port,
-                db=db,
-                password=password,
-                decode_responses=True
+                connection_pool=_get_connection_pool(host, port, db, password)
             )
             # 测试连接
             self.redis_client.ping()
@@ -41,8 +180,8 @@ class ShortMemory:
             self.is_connected = False
             logger.error(f"无法连接到Redis服务器: {str(e)}")
             logger.warning("将使用内存模式作为后备")
-            # 创建内存中的临时存储作为后备
-            self._memory_store = {}
+            # 创建内存中的临时存储作为后备：按用户保存定长队列，无需序列化
+            self._memory_store: Dict[str, Deque[MemoryMessage]] = {}
         
         self.memory_ttl = memory_ttl
         self.max_memory_size = max_memory_size
@@ -69,48 +208,29 @@ class ShortMemory:
             bool: 存储是否成功
         """
         try:
-            # 序列化消息，确保包含所有必要字段
-            serialized_messages = []
-            for msg in messages[-self.max_memory_size:]:  # 每次只保留最新的消息
-                # 确保消息是字典格式并包含所有必要字段
-                if isinstance(msg, dict):
-                    serialized_msg = {
-                        "message_id": msg.get("message_id", str(uuid.uuid4())),
-                        "type": msg.get("type", "human"),
-                        "content": msg.get("content", ""),
-                        "timestamp": msg.get("timestamp", datetime.now().isoformat()),
-                        "additional_kwargs": msg.get("additional_kwargs", {}),
-                        "name": msg.get("name", None),
-                        "importance_score": msg.get("importance_score", 0.0)
-                    }
-                else:
-                    # 尝试从对象获取属性
-                    serialized_msg = {
-                        "message_id": str(uuid.uuid4()),
-                        "type": getattr(msg, "type", "human"),
-                        "content": getattr(msg, "content", ""),
-                        "timestamp": datetime.now().isoformat(),
-                        "additional_kwargs": getattr(msg, "additional_kwargs", {}),
-                        "name": getattr(msg, "name", None),
-                        "importance_score": 0.0
-                    }
-                serialized_messages.append(serialized_msg)
-            
-            memory_data = json.dumps(serialized_messages, ensure_ascii=False)
+            # 确保包含所有必要字段；每次只保留最新的消息
+            normalized = [_normalize_message(msg) for msg in messages[-self.max_memory_size:]]
             key = self._get_memory_key(user_id)
             
             if self.is_connected and self.redis_client:
-                # 存储到Redis并设置过期时间
-                self.redis_client.setex(key, self.memory_ttl, memory_data)
-                logger.info(f"成功将用户记忆存储到Redis: {user_id}")
+                payloads = [_encode_message(msg) for msg in normalized]
+                # 整体替换用户的消息列表并设置过期时间，一次往返完成；
+                # 使用MULTI/EXEC保证替换的原子性，读者不会看到被清空或只写入一半的列表
+                pipe = self.redis_client.pipeline(transaction=True)
+                pipe.delete(key)
+                if payloads:
+                    pipe.rpush(key, *payloads)
+                    pipe.expire(key, self.memory_ttl)
+                pipe.execute()
+                logger.debug("成功将用户记忆存储到Redis: %s", user_id)
             else:
                 # 使用内存存储作为后备
-                self._memory_store[key] = memory_data
-                logger.info(f"使用内存存储用户记忆: {user_id}")
+                self._memory_store[key] = deque(normalized, maxlen=self.max_memory_size)
+                logger.debug("使用内存存储用户记忆: %s", user_id)
 
             return True
         except Exception as e:
-            logger.error(f"存储记忆时出错: {str(e)}")
+            logger.error("存储记忆时出错: %s", e)
             return False
     
     def get_memory(self, user_id: str) -> List[Dict[str, Any]]:
@@ -125,34 +245,22 @@ class ShortMemory:
         """
         try:
             key = self._get_memory_key(user_id)
-            memory_data = None
             
             if self.is_connected and self.redis_client:
-                # 从Redis获取
-                memory_data = self.redis_client.get(key)
+                # 从Redis列表获取，每个元素是一条消息
+                try:
+                    messages = [_decode_message(item) for item in self.redis_client.lrange(key, 0, -1)]
+                except redis.ResponseError:
+                    # 键类型不是列表：升级前的旧格式数据
+                    messages = self._migrate_legacy_memory(user_id)
             else:
                 # 从内存存储获取
-                memory_data = self._memory_store.get(key)
+                messages = list(self._memory_store.get(key, ()))
             
-            if memory_data:
-                messages = json.loads(memory_data)
-                # 确保所有消息都包含必要字段
-                normalized_messages = []
-                for msg in messages:
-                    normalized_msg = {
-                        "message_id": msg.get("message_id", str(uuid.uuid4())),
-                        "type": msg.get("type", "human"),
-                        "content": msg.get("content", ""),
-                        "timestamp": msg.get("timestamp", datetime.now().isoformat()),
-                        "additional_kwargs": msg.get("additional_kwargs", {}),
-                        "name": msg.get("name", None),
-                        "importance_score": msg.get("importance_score", 0.0)
-                    }
-                    normalized_messages.append(normalized_msg)
-                return normalized_messages
-            return []
+            # 消息在写入或解码时均已规范化，这里只转换为字典返回
+            return [msgspec.structs.asdict(msg) for msg in messages]
         except Exception as e:
-            logger.error(f"获取记忆时出错: {str(e)}")
+            logger.error("获取记忆时出错: %s", e)
             return []
     
     def add_message(self, user_id: str, message: Optional[Dict[str, Any]] = None, user_message: Optional[Dict[str, Any]] = None, **kwargs) -> bool:
@@ -168,9 +276,6 @@ class ShortMemory:
             bool: 添加是否成功
         """
         try:
-            # 获取现有记忆
-            existing_messages = self.get_memory(user_id)
-            
             # 确定要使用的消息对象
             msg_to_use = message or user_message or {}
             
@@ -178,47 +283,58 @@ class ShortMemory:
             importance_score = kwargs.get("importance_score", 0.0)
             
             # 根据消息类型创建新消息（支持字典和对象），确保包含所有必要字段
-            if isinstance(msg_to_use, dict):
-                new_message = {
-                    "message_id": msg_to_use.get("message_id", str(uuid.uuid4())),
-                    "type": msg_to_use.get("type", "human"),
-                    "content": msg_to_use.get("content", ""),
-                    "timestamp": msg_to_use.get("timestamp", datetime.now().isoformat()),
-                    "additional_kwargs": msg_to_use.get("additional_kwargs", {}),
-                    "name": msg_to_use.get("name", None),
-                    "importance_score": importance_score
-                }
-            else:
-                # 尝试从对象获取属性
-                new_message = {
-                    "message_id": str(uuid.uuid4()),
-                    "type": getattr(msg_to_use, "type", "human"),
-                    "content": getattr(msg_to_use, "content", ""),
-                    "timestamp": datetime.now().isoformat(),
-                    "additional_kwargs": getattr(msg_to_use, "additional_kwargs", {}),
-                    "name": getattr(msg_to_use, "name", None),
-                    "importance_score": importance_score
-                }
-            existing_messages.append(new_message)
-            
-            # 限制消息数量上限
-            if len(existing_messages) > self.max_memory_size:
-                existing_messages = existing_messages[-self.max_memory_size:]
-            
-            # 重新存储
+            new_message = _normalize_message(msg_to_use, importance_score)
+            # 只序列化新消息并追加到列表末尾，无需读取和重写整个历史
             key = self._get_memory_key(user_id)
-            memory_data = json.dumps(existing_messages, ensure_ascii=False)
             
             if self.is_connected and self.redis_client:
-                self.redis_client.setex(key, self.memory_ttl, memory_data)
+                payload = _encode_message(new_message)
+                try:
+                    self._append_payload(key, payload)
+                except redis.ResponseError:
+                    # 键仍是旧格式：先转换为列表再追加
+                    self._migrate_legacy_memory(user_id)
+                    self._append_payload(key, payload)
             else:
-                self._memory_store[key] = memory_data
+                # 定长队列自动丢弃最旧的消息，限制消息数量上限
+                self._memory_store.setdefault(key, deque(maxlen=self.max_memory_size)).append(new_message)
             
             return True
         except Exception as e:
-            logger.error(f"添加消息到记忆时出错: {str(e)}")
+            logger.error("添加消息到记忆时出错: %s", e)
             return False
     
+    def _append_payload(self, key: str, payload: bytes):
+        """
+        在一次往返中追加消息、裁剪到最大长度并刷新过期时间
+        
+        Args:
+            key: Redis键名
+            payload: 序列化后的消息
+        """
+        pipe = self.redis_client.pipeline(transaction=False)
+        pipe.rpush(key, payload)
+        pipe.ltrim(key, -self.max_memory_size, -1)
+        pipe.expire(key, self.memory_ttl)
+        pipe.execute()
+    
+    def _migrate_legacy_memory(self, user_id: str) -> List[MemoryMessage]:
+        """
+        将升级前以单个字符串值整体存储的记忆转换为列表格式
+        
+        Args:
+            user_id: 用户标识符
+            
+        Returns:
+            List[MemoryMessage]: 旧数据中的消息列表
+        """
+        key = self._get_memory_key(user_id)
+        memory_data = self.redis_client.get(key)
+        messages = [_normalize_message(msg) for msg in _decode_messages(memory_data)] if memory_data else []
+        self.store_memory(user_id, messages)
+        logger.info("已将用户记忆转换为列表格式: %s", user_id)
+        return messages
+    
     def delete_memory(self, user_id: str) -> bool:
         """
         删除指定用户的记忆
@@ -237,10 +353,10 @@ class ShortMemory:
                 if key in self._memory_store:
                     del self._memory_store[key]
             
-            logger.info(f"已删除用户记忆: {user_id}")
+            logger.debug("已删除用户记忆: %s", user_id)
             return True
         except Exception as e:
-            logger.error(f"删除记忆时出错: {str(e)}")
+            logger.error("删除记忆时出错: %s", e)
             return False
     
     def list_users(self) -> List[str]:
@@ -250,25 +366,20 @@ class ShortMemory:
             List[str]: 用户ID列表
         """
         try:
-            sessions = []
+            prefix_len = len(self.default_key_prefix)
             
             if self.is_connected and self.redis_client:
-                # 使用Redis的SCAN命令查找所有匹配的键
+                # 使用Redis的SCAN命令查找所有匹配的键，较大的COUNT减少往返次数
                 pattern = f"{self.default_key_prefix}*"
-                for key in self.redis_client.scan_iter(match=pattern):
-                    # 提取用户ID
-                    user_id = key[len(self.default_key_prefix):]
-                    sessions.append(user_id)
-            else:
-                # 从内存存储中获取
-                for key in self._memory_store.keys():
-                    if key.startswith(self.default_key_prefix):
-                        user_id = key[len(self.default_key_prefix):]
-                        sessions.append(user_id)
+                # 提取用户ID（客户端不解码响应，键为bytes）
+                return [key.decode()[prefix_len:]
+                        for key in self.redis_client.scan_iter(match=pattern, count=SCAN_COUNT)]
             
-            return sessions
+            # 从内存存储中获取
+            return [key[prefix_len:] for key in self._memory_store
+                    if key.startswith(self.default_key_prefix)]
         except Exception as e:
-            logger.error(f"列出用户时出错: {str(e)}")
+            logger.error("列出用户时出错: %s", e)
             return []
     
     def update_ttl(self, user_id: str, ttl: Optional[int] = None) -> bool:
@@ -290,13 +401,10 @@ class ShortMemory:
             key = self._get_memory_key(user_id)
             actual_ttl = ttl if ttl is not None else self.memory_ttl
             
-            # 检查键是否存在
-            if self.redis_client.exists(key):
-                self.redis_client.expire(key, actual_ttl)
-                return True
-            return False
+            # EXPIRE在键不存在时返回0，无需先用EXISTS检查，一次往返完成
+            return bool(self.redis_client.expire(key, actual_ttl))
         except Exception as e:
-            logger.error(f"更新TTL时出错: {str(e)}")
+            logger.error("更新TTL时出错: %s", e)
             return False
 
 
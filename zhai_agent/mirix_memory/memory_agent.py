@@ -1,16 +1,29 @@
 import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, Future
 from typing import Dict, Any, Optional
 from mirix import Mirix
 import os
 from ..config import settings
+from .. import configure_logging
 
 logger = logging.getLogger(__name__)
 
+# 用户名到用户ID缓存的最大条目数
+USER_ID_CACHE_MAXSIZE = 4096
+# 后台待写入记忆的最大条数，写入积压时提交方等待，避免队列无限增长
+MAX_PENDING_WRITES = 64
+
 
 
 
 
 class MirixMemoryAgent:
+    # 后台写入记忆的线程池：单线程保证同一进程内的记忆按提交顺序写入
+    _WRITE_POOL = ThreadPoolExecutor(max_workers=1, thread_name_prefix="mirix-memory-write")
+    _WRITE_SLOTS = threading.BoundedSemaphore(MAX_PENDING_WRITES)
+    
     def __init__(self, api_key: str = None, model: str = None):
         logger.info(f"正在初始化MirixMemoryAgent实例...")
         
@@ -19,18 +32,12 @@ class MirixMemoryAgent:
         
         # 使用配置初始化
         self.mirix_agent = Mirix(api_key=self.api_key, model=self.model)
+        # 用户名 -> 用户ID 的LRU缓存，同一会话的每轮对话无需重复查询SDK
+        self._user_id_cache = OrderedDict()
+        self._user_id_cache_lock = threading.Lock()
         logger.info(f"Mirix实例初始化完成")
-        # 1. 基础重置：将全局根日志级别设为 INFO
-        # 这样 neo4j, urllib3 等第三方库默认只会打印 INFO 及以上级别的日志
-        logging.basicConfig(
-            level=logging.INFO, 
-            format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-            force=True 
-        )
-
-        # 2. 针对您自己的项目，开启 DEBUG 级别
-        # 这样 zhai_agent 下的 logger.debug(...) 依然可以看到
-        logging.getLogger("zhai_agent").setLevel(logging.DEBUG)
+        # 日志配置只在进程内第一次创建实例时执行，不再每次重建根handler
+        configure_logging()
 
 
     def add_memory(self, memory: str, user_name: Optional[str] = None) -> Dict[str, Any]:
@@ -46,8 +53,29 @@ class MirixMemoryAgent:
             logger.error(f"添加记忆失败: {e}")
             return {"status": "error", "message": str(e)}
 
-    def _ensure_user_exists(self, user_name: str) -> None:
-        """确保用户存在，如果不存在则创建"""
+    def add_memory_async(self, memory: str, user_name: Optional[str] = None) -> Future:
+        """
+        在后台线程中添加记忆，立即返回，不阻塞当前对话轮次的响应
+        
+        Args:
+            memory: 记忆内容
+            user_name: 用户名
+            
+        Returns:
+            Future: 写入结果，值与 add_memory 的返回值相同
+        """
+        # 积压达到上限时在此等待，正常情况下立即返回
+        self._WRITE_SLOTS.acquire()
+        try:
+            future = self._WRITE_POOL.submit(self.add_memory, memory, user_name)
+        except Exception:
+            self._WRITE_SLOTS.release()
+            raise
+        future.add_done_callback(lambda _: self._WRITE_SLOTS.release())
+        return future
+
+    def _ensure_user_exists(self, user_name: str):
+        """确保用户存在，如果不存在则创建；返回查询到的用户对象，创建失败时返回None"""
         # 正确逻辑：先查询用户，若返回None则创建
         user = self.mirix_agent.get_user_by_name(user_name)
         if user is None:  # 当用户不存在时，get_user_by_name返回None
@@ -57,11 +85,15 @@ class MirixMemoryAgent:
                 logger.info(f"创建新用户成功: {user_name}")
             except Exception as e:
                 logger.error(f"创建用户失败: {e}")
+                return None
+            # 仅在新建用户后才需要重新查询
+            user = self.mirix_agent.get_user_by_name(user_name)
+        return user
 
     def extract_memory_for_system_prompt(self, conversation_buffer: str, user_name: str) -> Optional[str]:
         """提取用户记忆用于系统提示，确保用户存在"""
-        self._ensure_user_exists(user_name)  # 先确保用户存在
         try:
+            # get_user_id 内部会确保用户存在
             user_id = self.get_user_id(user_name)
             # 注意：extract_memory_for_system_prompt的第一个参数是对话缓冲区（conversation_buffer）
             return self.mirix_agent.extract_memory_for_system_prompt(conversation_buffer, user_id)
@@ -71,9 +103,20 @@ class MirixMemoryAgent:
 
     def get_user_id(self, user_name: str) -> str:
         """获取用户ID，确保用户存在"""
-        self._ensure_user_exists(user_name)  # 双重保险：获取前先确保用户存在
-        user = self.mirix_agent.get_user_by_name(user_name)
+        with self._user_id_cache_lock:
+            user_id = self._user_id_cache.get(user_name)
+            if user_id is not None:
+                self._user_id_cache.move_to_end(user_name)
+                return user_id
+        
+        # 已存在的用户只需一次查询
+        user = self._ensure_user_exists(user_name)
         if user is None:
-            # 如果仍为None，说明创建用户失败，主动抛错提示
+            # 如果仍为None，说明创建用户失败，主动抛错提示（失败结果不写入缓存）
             raise ValueError(f"用户 {user_name} 不存在且创建失败，请检查SDK配置")
+        
+        with self._user_id_cache_lock:
+            self._user_id_cache[user_name] = user.id
+            while len(self._user_id_cache) > USER_ID_CACHE_MAXSIZE:
+                self._user_id_cache.popitem(last=False)
         return user.id  # 此时user一定非None，可安全访问id
\ No newline at end of file
@@ -1,6 +1,6 @@
 # -*- coding: utf-8 -*-
 from pydantic import BaseModel, Field
-from typing import List, Dict, Any, Optional,Annotated
+from typing import List, Any, Optional,Annotated
 import operator
 from langgraph.graph.message import add_messages
 
@@ -11,8 +11,8 @@ class ChatState(BaseModel):
     """
     #每次消息是追加而非覆盖
     messages: Annotated[List[Any], add_messages] = Field(default_factory=list)
-    #每次检索结果为覆盖
-    retrieved_documents: List[Dict[str, Any]] = Field(default_factory=list)
+    #每次检索结果为覆盖（元素为文档字典，不做逐项的递归校验）
+    retrieved_documents: list = Field(default_factory=list)
    
     query: Optional[str] = None
     round: int = 0
@@ -1,17 +1,14 @@
-def _build_kg_search_prompt(user_name:str,query:str)->str:
-   # 注意：这里不再手动列出工具函数签名，依靠 @tool 的 docstring 自动注入
-   return f"""你是一个基于知识图谱的智能助手，负责将用户的自然语言问题转化为精确的图谱查询操作。
+from typing import Tuple
 
-### 当前上下文
-- 当前用户名称: "{user_name}"
-- 用户当前问题: "{query}"
+# 固定不变的指令部分放在最前面，使服务端的前缀缓存（prompt caching）可以命中
+KG_SEARCH_STATIC_PROMPT = """你是一个基于知识图谱的智能助手，负责将用户的自然语言问题转化为精确的图谱查询操作。
 
 ### 你的核心任务
 你需要分析用户意图，并决定调用哪些工具来获取信息。请遵循以下逻辑：
 
 1. **实体识别与消歧**：
    - 分析问题中提到的关键实体（人、事、物）。
-   - **特别注意**：如果用户提到"我"、"我的"或与自身相关的问题，请务必将实体定位为"{user_name}"。
+   - **特别注意**：如果用户提到"我"、"我的"或与自身相关的问题，请务必将实体定位为上下文中的当前用户名称。
 
 2. **查询策略选择**：
    - **情况 A - 探索/查找实体**：如果不确定实体的确切名称，或需要查找包含某些关键字的节点，请使用搜索类工具。
@@ -31,3 +28,12 @@ def _build_kg_search_prompt(user_name:str,query:str)->str:
 
 请现在开始思考并选择合适的工具执行。"""
 
+
+def _build_kg_search_prompt(user_name:str,query:str)->Tuple[str, str]:
+   # 注意：这里不再手动列出工具函数签名，依靠 @tool 的 docstring 自动注入
+   # 返回 (固定指令前缀, 当前上下文)
+   return KG_SEARCH_STATIC_PROMPT, (
+      "### 当前上下文\n"
+      f'- 当前用户名称: "{user_name}"\n'
+      f'- 用户当前问题: "{query}"'
+   )
@@ -1,8 +1,7 @@
-def _build_intelligent_system_prompt(memory_context: str) -> str:
-        """
-        构建智能系统提示词，包含kg工具使用说明
-        """
-        return f"""你是一个智能助手，具备知识图谱构建能力。你可以根据对话内容和记忆信息，主动使用知识图谱工具来提取和存储重要信息。
+from typing import Tuple
+
+# 固定不变的指令部分放在最前面，使服务端的前缀缓存（prompt caching）可以命中
+KG_TOOLS_STATIC_PROMPT = """你是一个智能助手，具备知识图谱构建能力。你可以根据对话内容和记忆信息，主动使用知识图谱工具来提取和存储重要信息。
 
 你的能力包括：
 1. 分析对话内容，识别关键实体（人物、组织、地点、概念等）
@@ -10,9 +9,6 @@ def _build_intelligent_system_prompt(memory_context: str) -> str:
 3. 使用知识图谱工具创建实体和关系
 4. 基于已有记忆信息进行推理
 
-记忆信息：
-{memory_context}
-
 知识图谱构建规范：
 - 实体名称可以使用中文（如："繁花"、"抹茶奶茶"）
 - 实体类型和关系类型必须使用英文，且以字母开头
@@ -36,4 +32,13 @@ def _build_intelligent_system_prompt(memory_context: str) -> str:
 - 避免重复创建相同的实体
 - 确保关系类型和实体类型符合英文命名规范
 
-请根据用户的问题和已有记忆，提供有帮助的回答。如果适合构建知识图谱，请主动使用相应工具。"""
\ No newline at end of file
+请根据用户的问题和已有记忆，提供有帮助的回答。如果适合构建知识图谱，请主动使用相应工具。"""
+
+
+def _build_intelligent_system_prompt(memory_context: str) -> Tuple[str, str]:
+        """
+        构建智能系统提示词，包含kg工具使用说明
+        返回 (固定指令前缀, 随对话变化的记忆信息)
+        """
+        return KG_TOOLS_STATIC_PROMPT, f"""记忆信息：
+{memory_context}"""
@@ -6,6 +6,9 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+# 交叉编码器单次前向计算的默认批大小
+DEFAULT_BATCH_SIZE = 32
+
 
 class DocumentReranker:
     """
@@ -33,12 +36,26 @@ class DocumentReranker:
             logger.error(f"加载重排模型时出错: {str(e)}")
             self.rerank_model = None
     
-    def rerank_documents(self, retrieved_docs: List[Document], query: str) -> List[Document]:
+    def _score(self, pairs, batch_size: int = DEFAULT_BATCH_SIZE):
+        """
+        批量计算查询-文档对的相关性分数，同一批的文档对在一次前向计算中完成
+        Args:
+            pairs: 查询-文档对列表
+            batch_size: 批大小
+        Returns:
+            相关性分数序列
+        """
+        # HuggingFaceCrossEncoder 本身不带 predict，直接调用底层 sentence-transformers 的 CrossEncoder
+        return self.rerank_model.client.predict(pairs, batch_size=batch_size, show_progress_bar=False)
+    
+    def rerank_documents(self, retrieved_docs: List[Document], query: str,
+                         batch_size: int = DEFAULT_BATCH_SIZE) -> List[Document]:
         """
         对检索到的文档进行重新排序
         Args:
             retrieved_docs: 检索到的文档列表
             query: 用户查询
+            batch_size: 交叉编码器批大小
         Returns:
             List[Document]: 重新排序后的文档列表
         """
@@ -51,7 +68,7 @@ class DocumentReranker:
             pairs = [[query, doc.page_content] for doc in retrieved_docs]
             
             # 获取相关性分数
-            scores = self.rerank_model.predict(pairs)
+            scores = self._score(pairs, batch_size)
             
             # 按分数降序排序文档
             sorted_docs = [doc for _, doc in sorted(zip(scores, retrieved_docs), 
@@ -70,12 +87,14 @@ class DocumentReranker:
             # 出错时返回原始文档
             return retrieved_docs
     
-    def rerank_with_scores(self, retrieved_docs: List[Document], query: str) -> List[tuple]:
+    def rerank_with_scores(self, retrieved_docs: List[Document], query: str,
+                           batch_size: int = DEFAULT_BATCH_SIZE) -> List[tuple]:
         """
         对检索到的文档进行重新排序并返回分数
         Args:
             retrieved_docs: 检索到的文档列表
             query: 用户查询
+            batch_size: 交叉编码器批大小
         Returns:
             List[tuple]: 包含(文档, 分数)的列表
         """
@@ -84,7 +103,7 @@ class DocumentReranker:
         
         try:
             pairs = [[query, doc.page_content] for doc in retrieved_docs]
-            scores = self.rerank_model.predict(pairs)
+            scores = self._score(pairs, batch_size)
             
             # 返回文档和分数的元组列表，按分数降序排序
             scored_docs = sorted(zip(retrieved_docs, scores), key=lambda x: x[1], reverse=True)
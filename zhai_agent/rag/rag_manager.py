@@ -1,12 +1,12 @@
 # -*- coding: utf-8 -*-
 import logging
 import os
-from typing import List
+from typing import List, AsyncIterator
 from langchain_core.documents import Document
 from ..llm.llm_client import get_llm_client
 from ..rag.document_reranker import get_document_reranker
 from ..config import settings
-from ..prompt.prompt_builder import PromptBuilder
+from ..prompt.prompt_builder import get_prompt_builder
 
 logger = logging.getLogger(__name__)
 
@@ -25,7 +25,7 @@ class RAGManager:
         # 初始化各个组件
         self.llm_client = get_llm_client()
         self.document_reranker = get_document_reranker()
-        self.prompt_builder = PromptBuilder()
+        self.prompt_builder = get_prompt_builder()
     
     def retrieve_documents(self, retriever, query):
         """
@@ -48,17 +48,18 @@ class RAGManager:
             logger.error(f"检索文档时出错: {str(e)}")
             return []
     
-    def reRank(self, retrieved_docs: List[Document], query: str) -> List[Document]:
+    def reRank(self, retrieved_docs: List[Document], query: str, batch_size: int = 32) -> List[Document]:
         """
         对检索到的文档进行重新排序
         
         Args:
             retrieved_docs: 检索到的文档列表
             query: 用户查询
+            batch_size: 交叉编码器批大小
         Returns:
             List[Document]: 重新排序后的文档列表
         """
-        return self.document_reranker.rerank_documents(retrieved_docs, query)
+        return self.document_reranker.rerank_documents(retrieved_docs, query, batch_size=batch_size)
     
     def format_retrieved_documents(self, retrieved_docs: List[Document]) -> str:
         """
@@ -103,4 +104,16 @@ class RAGManager:
         """
         return self.llm_client.call_model(prompt)
 
+    def astream_llm(self, prompt: str) -> AsyncIterator[str]:
+        """
+        流式调用语言模型
+        
+        Args:
+            prompt: 提示内容
+            
+        Returns:
+            AsyncIterator[str]: 模型响应片段
+        """
+        return self.llm_client.astream_model(prompt)
+
     
\ No newline at end of file
@@ -1,6 +1,6 @@
 # -*- coding: utf-8 -*-
 import logging
-from typing import List, Dict, Any
+from typing import List, Dict, Any, AsyncIterator
 from zhai_agent.models.chat_state import ChatState
 from langchain_core.messages import HumanMessage
 
@@ -66,6 +66,29 @@ class UserInterface:
             if result and 'retrieved_documents' in result and result['retrieved_documents']:
                 self._display_retrieved_documents(result['retrieved_documents'])
     
+    async def display_ai_response_stream(self, stream_iter: AsyncIterator[Dict[str, Any]]):
+        """
+        流式显示AI响应，回复节点完成后立即输出，后台节点继续执行
+        
+        Args:
+            stream_iter: 工作流节点更新事件的异步迭代器
+        """
+        streamed = False
+        async for event in stream_iter:
+            if "error" in event:
+                print(f"\nAI: 抱歉，处理您的消息时出错: {event['error']}")
+            elif "token" in event:
+                # 回复片段到达即输出
+                if not streamed:
+                    print("\nAI: ", end="", flush=True)
+                    streamed = True
+                print(event["token"], end="", flush=True)
+            elif event.get("generate_answer"):
+                if streamed:
+                    print()
+                else:
+                    self.display_ai_response(event["generate_answer"])
+    
     def _display_retrieved_documents(self, retrieved_documents: list):
         """
         显示检索到的文档
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+"""
+LLM 响应缓存
+"""
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+# 尝试导入orjson加速缓存键的序列化，但不强制要求
+ORJSON_AVAILABLE = False
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    pass
+
+# 默认缓存条数与过期时间（秒）
+DEFAULT_MAXSIZE = 1024
+DEFAULT_TTL = 600
+# 温度高于该值时输出本身是随机的，不做缓存
+MAX_CACHEABLE_TEMPERATURE = 0.3
+
+
+def _dumps(obj: Any) -> bytes:
+    """
+    按键排序序列化为字节，优先使用 orjson
+    """
+    if ORJSON_AVAILABLE:
+        try:
+            return orjson.dumps(obj, default=str, option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            pass
+    return json.dumps(obj, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8")
+
+
+class InMemoryCache:
+    """
+    进程内 LRU + TTL 缓存，键为请求内容的 sha256 摘要
+    """
+
+    def __init__(self, maxsize: int = DEFAULT_MAXSIZE, ttl: float = DEFAULT_TTL):
+        """
+        初始化缓存
+        Args:
+            maxsize: 最大缓存条数
+            ttl: 过期时间（秒）
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(messages, tools=None, temperature=None) -> str:
+        """
+        根据消息、工具定义和温度生成缓存键
+        Args:
+            messages: 消息列表
+            tools: 工具列表
+            temperature: 温度参数
+        Returns:
+            str: 缓存键
+        """
+        hasher = hashlib.sha256()
+        hasher.update(_dumps(messages))
+        hasher.update(_dumps(tools))
+        hasher.update(repr(temperature).encode("utf-8"))
+        return hasher.hexdigest()
+
+    def get(self, key: str) -> Optional[Any]:
+        """
+        读取缓存，未命中或已过期返回 None
+        """
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any) -> None:
+        """
+        写入缓存，超出容量时淘汰最久未使用的条目
+        """
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def get_or_set(self, key: str, factory: Callable[[], Any]) -> Any:
+        """
+        命中时直接返回缓存值，否则调用 factory 计算并写入缓存
+        """
+        value = self.get(key)
+        if value is None:
+            value = factory()
+            self.set(key, value)
+        return value
+
+    def clear(self) -> None:
+        """
+        清空缓存
+        """
+        with self._lock:
+            self._data.clear()
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+"""
+语义缓存：按查询向量的余弦相似度命中，语义相同的提问复用已有结果
+"""
+import bisect
+import logging
+import threading
+import time
+from typing import Any, Dict, List, Optional
+import faiss
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# 默认相似度阈值、过期时间（秒）及每个命名空间的最大条数
+DEFAULT_THRESHOLD = 0.95
+DEFAULT_TTL = 600
+DEFAULT_MAX_ENTRIES = 256
+# 查找时取的近邻个数，最近的条目已过期时继续检查次近的条目
+LOOKUP_K = 8
+
+
+class _Namespace:
+    """
+    单个命名空间的向量索引及对应的缓存值
+    """
+
+    def __init__(self, dim: int):
+        self.index = faiss.IndexFlatIP(dim)
+        self.values: List[Any] = []
+        self.created_at: List[float] = []
+
+
+class SemanticCache:
+    """
+    基于 FAISS 内积索引的语义缓存，向量归一化后内积即余弦相似度
+    """
+
+    def __init__(self, threshold: float = DEFAULT_THRESHOLD, ttl: float = DEFAULT_TTL,
+                 max_entries: int = DEFAULT_MAX_ENTRIES):
+        """
+        初始化语义缓存
+        Args:
+            threshold: 命中所需的最小余弦相似度
+            ttl: 过期时间（秒）
+            max_entries: 每个命名空间的最大条数
+        """
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._namespaces: Dict[str, _Namespace] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _normalize(vector) -> np.ndarray:
+        matrix = np.asarray(vector, dtype=np.float32).reshape(1, -1)
+        faiss.normalize_L2(matrix)
+        return matrix
+
+    def lookup(self, namespace: str, vector) -> Optional[Any]:
+        """
+        查找与向量最相似且未过期的缓存值
+        Args:
+            namespace: 命名空间（如用户名）
+            vector: 查询向量
+        Returns:
+            命中的缓存值，未命中返回 None
+        """
+        query = self._normalize(vector)
+        with self._lock:
+            ns = self._namespaces.get(namespace)
+            if ns is None or ns.index.ntotal == 0 or ns.index.d != query.shape[1]:
+                return None
+            scores, ids = ns.index.search(query, min(LOOKUP_K, ns.index.ntotal))
+            now = time.monotonic()
+            # 结果按相似度降低排列，返回第一个未过期的条目
+            for score, idx in zip(scores[0], ids[0]):
+                if idx < 0 or score < self.threshold:
+                    return None
+                if now - ns.created_at[idx] <= self.ttl:
+                    logger.debug("语义缓存命中: namespace=%s, similarity=%.4f", namespace, score)
+                    return ns.values[idx]
+            return None
+
+    def add(self, namespace: str, vector, value: Any) -> None:
+        """
+        写入缓存
+        Args:
+            namespace: 命名空间（如用户名）
+            vector: 查询向量
+            value: 缓存值
+        """
+        entry = self._normalize(vector)
+        with self._lock:
+            ns = self._namespaces.get(namespace)
+            if ns is None or ns.index.d != entry.shape[1]:
+                ns = self._namespaces[namespace] = _Namespace(entry.shape[1])
+            elif ns.index.ntotal >= self.max_entries:
+                # 超出容量时丢弃过期和较旧的一半条目后重建索引
+                ns = self._compact(ns)
+                self._namespaces[namespace] = ns
+            else:
+                self._evict_expired(ns)
+            ns.index.add(entry)
+            ns.values.append(value)
+            ns.created_at.append(time.monotonic())
+
+    def _evict_expired(self, ns: _Namespace) -> None:
+        """
+        删除已过期的条目。条目按写入时间顺序追加，过期条目总是位于开头
+        """
+        expired = bisect.bisect_left(ns.created_at, time.monotonic() - self.ttl)
+        if expired:
+            ns.index.remove_ids(np.arange(expired, dtype=np.int64))
+            del ns.values[:expired]
+            del ns.created_at[:expired]
+
+    def _compact(self, ns: _Namespace) -> _Namespace:
+        now = time.monotonic()
+        keep = [
+            i for i in range(ns.index.ntotal)
+            if now - ns.created_at[i] <= self.ttl
+        ][-(self.max_entries // 2):]
+        compacted = _Namespace(ns.index.d)
+        if keep:
+            compacted.index.add(ns.index.reconstruct_batch(np.asarray(keep, dtype=np.int64)))
+            compacted.values = [ns.values[i] for i in keep]
+            compacted.created_at = [ns.created_at[i] for i in keep]
+        return compacted
+
+    def invalidate(self, namespace: str) -> None:
+        """
+        清除某个命名空间的全部缓存
+        """
+        with self._lock:
+            self._namespaces.pop(namespace, None)
+
+    def clear(self) -> None:
+        """
+        清空缓存
+        """
+        with self._lock:
+            self._namespaces.clear()
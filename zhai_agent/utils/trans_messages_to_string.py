@@ -1,6 +1,22 @@
-from typing import List, Dict, Any, Union
+from typing import List, Dict, Any, Union, Tuple
 from langchain_core.messages import HumanMessage, AIMessage
 
+# 各消息类型在对话文本中的前缀，未列出的类型（如system、tool）不输出
+PREFIX = {'human': "用户: ", 'ai': "AI: "}
+
+
+def _extract(msg: Union[Dict[str, Any], HumanMessage, AIMessage]) -> Tuple[str, Any]:
+    """
+    取出消息的类型和内容，兼容字典类型和消息对象
+    Args:
+        msg: 单条消息
+    Returns:
+        (消息类型, 消息内容)
+    """
+    if isinstance(msg, dict):
+        return msg.get('type', ''), msg.get('content', '')
+    return getattr(msg, 'type', ''), getattr(msg, 'content', '')
+
 
 def trans_messages_to_string(messages: List[Union[Dict[str, Any], HumanMessage, AIMessage]]) -> str:
     """
@@ -10,23 +26,16 @@ def trans_messages_to_string(messages: List[Union[Dict[str, Any], HumanMessage,
     Returns:
         记忆提示字符串
     """
-    conversation_history = ""
+    # 先收集片段再一次性拼接，避免字符串反复 += 带来的二次方开销
+    parts = []
+    append = parts.append
     for msg in messages:
-        # 兼容字典类型和消息对象
-        if isinstance(msg, dict):
-            msg_type = msg.get('type', '')
-            content = msg.get('content', '')
-        else:
-            msg_type = getattr(msg, 'type', '')
-            content = getattr(msg, 'content', '')
-        
-        if msg_type == 'human':
-            conversation_history += f"用户: {content}\n"
-        elif msg_type == 'ai':
-            conversation_history += f"AI: {content}\n"
+        msg_type, content = _extract(msg)
+        prefix = PREFIX.get(msg_type)
+        if prefix is not None:
+            append(prefix)
+            append(str(content))
+            append("\n")
     
     # 移除最后一个换行
-    if conversation_history:
-        conversation_history = conversation_history.rstrip('\n')
-        
-    return conversation_history
+    return "".join(parts).rstrip('\n')
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""
+自定义检索器
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+# 尝试导入bm25s，但不强制要求
+BM25S_AVAILABLE = False
+try:
+    import bm25s
+    BM25S_AVAILABLE = True
+except ImportError:
+    pass
+
+logger = logging.getLogger(__name__)
+
+# 并发执行各路检索，FAISS检索时会释放GIL，可与BM25打分重叠
+_RETRIEVE_POOL = ThreadPoolExecutor(max_workers=2, thread_name_prefix="hybrid-retrieve")
+
+
+class BM25sRetriever(BaseRetriever):
+    """
+    基于bm25s的关键词检索器，打分过程由NumPy向量化完成
+    """
+    docs: List[Document]
+    model: Any = None
+    k: int = 3
+
+    @classmethod
+    def from_documents(cls, documents, k=3):
+        """
+        根据文档列表构建BM25索引
+        Args:
+            documents: 文档列表
+            k: 返回的文档数量
+        Returns:
+            BM25sRetriever: 检索器实例
+        """
+        docs = list(documents)
+        model = bm25s.BM25()
+        model.index(
+            bm25s.tokenize([d.page_content for d in docs], show_progress=False),
+            show_progress=False
+        )
+        return cls(docs=docs, model=model, k=k)
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        k = min(self.k, len(self.docs))
+        if k <= 0:
+            return []
+        results, _ = self.model.retrieve(
+            bm25s.tokenize([query], show_progress=False), k=k, show_progress=False
+        )
+        return [self.docs[i] for i in results[0]]
+
+
+class RRFRetriever(BaseRetriever):
+    """
+    倒数排名融合（RRF）检索器，按 score(d) = Σ 1/(k + rank_i(d)) 合并多个检索器的结果，
+    只依赖排名，不受各检索器打分尺度差异的影响
+    """
+    retrievers: List[BaseRetriever]
+    k: int = 60
+    top_k: int = 3
+
+    @staticmethod
+    def _doc_key(doc: Document):
+        # 不同检索器返回的同一文档不一定带有相同的id，按内容和来源去重
+        return (doc.page_content, doc.metadata.get("source"))
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        # 为每个文档分配整数编号，随后用向量化运算一次性累加各路的 RRF 分数
+        doc_index: Dict[Any, int] = {}
+        docs: List[Document] = []
+        ids: List[int] = []
+        ranks: List[int] = []
+        config = {"callbacks": run_manager.get_child()}
+        futures = [
+            _RETRIEVE_POOL.submit(retriever.invoke, query, config=config)
+            for retriever in self.retrievers
+        ]
+        for future in futures:
+            for rank, doc in enumerate(future.result(), start=1):
+                key = self._doc_key(doc)
+                idx = doc_index.get(key)
+                if idx is None:
+                    idx = doc_index[key] = len(docs)
+                    docs.append(doc)
+                ids.append(idx)
+                ranks.append(rank)
+        if not docs:
+            return []
+        
+        scores = np.bincount(
+            np.asarray(ids, dtype=np.int64),
+            weights=1.0 / (self.k + np.asarray(ranks, dtype=np.float64)),
+            minlength=len(docs)
+        )
+        # 稳定排序：同分时保持首次出现的顺序
+        order = np.argsort(-scores, kind="stable")[:self.top_k]
+        return [docs[i] for i in order]
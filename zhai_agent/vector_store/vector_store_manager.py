@@ -2,12 +2,17 @@
 import logging
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_community.vectorstores import FAISS
+from langchain_community.docstore.in_memory import InMemoryDocstore
 from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_community.embeddings import FakeEmbeddings
 from langchain_community.retrievers import BM25Retriever
+from .retrievers import BM25S_AVAILABLE, BM25sRetriever, RRFRetriever
 
 
 import os
+import hashlib
+import faiss
+import numpy as np
 import requests
 # 尝试导入sentence_transformers，但不强制要求
 SENTENCE_TRANSFORMERS_AVAILABLE = False
@@ -19,11 +24,33 @@ except ImportError:
 
 logger = logging.getLogger(__name__)
 
+# 文本分块参数：优先按段落、句子切分，重叠约15%
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 150
+CHUNK_SEPARATORS = ["\n\n", "\n", "。", "！", "？", ".", " ", ""]
+# 嵌入模型批量编码大小
+EMBED_BATCH_SIZE = 64
+# FAISS索引持久化目录，子目录名为语料指纹。
+# 固定在当前用户的缓存目录下，不随进程工作目录变化，只有本程序会写入
+FAISS_CACHE_DIR = os.path.join(
+    os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache"),
+    "zhai_agent", "faiss"
+)
+# HNSW图索引参数
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 200
+HNSW_EF_SEARCH = 64
+# 索引结构及分块参数标识，参与语料指纹计算，变化后旧缓存自动失效
+INDEX_TAG = f"HNSW{HNSW_M}_SQ8_C{CHUNK_SIZE}_{CHUNK_OVERLAP}"
+
 
 class VectorStoreManager:
     """
     向量存储管理器，负责创建和管理向量存储
     """
+    # 进程内共享的嵌入模型及网络检查结果，避免每次创建向量存储都重新加载模型
+    _cached_embeddings = None
+    _connection_checked = None
     
     def __init__(self):
         """
@@ -44,15 +71,150 @@ class VectorStoreManager:
         if not documents:
             return None
         
+        # 嵌入模型在进程内只加载一次
+        embeddings = self._get_embeddings()
+        
+        # 语料未变化时直接加载已持久化的索引，跳过重新编码
+        fingerprint = self._corpus_fingerprint(
+            documents, f"{type(embeddings).__name__}:{INDEX_TAG}"
+        )
+        cache_dir = os.path.join(FAISS_CACHE_DIR, fingerprint)
+        if os.path.isdir(cache_dir):
+            try:
+                # docstore 以 pickle 保存，加载需要反序列化：目录固定在本程序专属的缓存目录下，
+                # 其中的文件都由下方的 save_local 写入，视为可信
+                vectorstore = FAISS.load_local(
+                    cache_dir, embeddings, allow_dangerous_deserialization=True
+                )
+                logger.info(f"已从缓存加载向量存储: {cache_dir}")
+                self.vectorstore = vectorstore
+                return vectorstore
+            except Exception as e:
+                logger.warning(f"加载向量存储缓存失败，将重新构建: {str(e)}")
+        
         # 将文档分割成块
         text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=500,
-            chunk_overlap=50
+            chunk_size=CHUNK_SIZE,
+            chunk_overlap=CHUNK_OVERLAP,
+            separators=CHUNK_SEPARATORS,
+            length_function=len
         )
         chunks = text_splitter.split_documents(documents)
         
         logger.info(f"文档已分割为 {len(chunks)} 块")
         
+        # 一次性批量编码所有文本块，再直接用向量构建索引
+        texts = [c.page_content for c in chunks]
+        vectors = embeddings.embed_documents(texts)
+        
+        if not vectors:
+            return None
+        
+        # 创建向量存储，使用HNSW图索引代替默认的暴力检索
+        vectorstore = FAISS(
+            embedding_function=embeddings,
+            index=self._build_index(vectors),
+            docstore=InMemoryDocstore(),
+            index_to_docstore_id={}
+        )
+        vectorstore.add_embeddings(
+            list(zip(texts, vectors)),
+            metadatas=[c.metadata for c in chunks]
+        )
+        
+        try:
+            # 缓存目录仅当前用户可写，避免其它用户放入被反序列化的文件
+            os.makedirs(FAISS_CACHE_DIR, mode=0o700, exist_ok=True)
+            vectorstore.save_local(cache_dir)
+            logger.info(f"向量存储已保存到: {cache_dir}")
+        except Exception as e:
+            logger.warning(f"保存向量存储缓存失败: {str(e)}")
+        
+        self.vectorstore = vectorstore
+        return vectorstore
+    
+    @staticmethod
+    def _build_index(vectors):
+        """
+        创建8位标量量化的HNSW图索引，查询复杂度近似log(N)，内存约为float32的1/4
+        
+        Args:
+            vectors: 用于训练量化器的向量列表
+            
+        Returns:
+            faiss.Index: 已训练的空索引
+        """
+        matrix = np.asarray(vectors, dtype=np.float32)
+        index = faiss.IndexHNSWSQ(matrix.shape[1], faiss.ScalarQuantizer.QT_8bit, HNSW_M)
+        index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        index.hnsw.efSearch = HNSW_EF_SEARCH
+        # 标量量化器需要先根据数据分布训练取值范围
+        index.train(matrix)
+        return index
+    
+    @staticmethod
+    def _corpus_fingerprint(documents, embedding_name=""):
+        """
+        根据文档来源文件的路径、大小和修改时间计算语料指纹
+        
+        Args:
+            documents: 文档列表
+            embedding_name: 嵌入模型名称，不同模型生成的索引互不复用
+            
+        Returns:
+            str: 语料指纹
+        """
+        entries = set()
+        for doc in documents:
+            source = doc.metadata.get("source", "")
+            try:
+                stat = os.stat(source)
+                entries.add((source, stat.st_size, stat.st_mtime_ns))
+            except (OSError, TypeError):
+                # 来源不是本地文件时退化为按内容计算
+                content_digest = hashlib.blake2b(
+                    doc.page_content.encode("utf-8"), digest_size=16
+                ).hexdigest()
+                entries.add((str(source), len(doc.page_content), content_digest))
+        
+        hasher = hashlib.blake2b(digest_size=16)
+        hasher.update(embedding_name.encode("utf-8"))
+        for entry in sorted(entries, key=repr):
+            hasher.update(repr(entry).encode("utf-8"))
+        return hasher.hexdigest()
+    
+    @staticmethod
+    def _check_huggingface_connection():
+        """
+        检查与huggingface镜像站的网络连接，结果在进程内缓存
+        
+        Returns:
+            bool: 是否可以连接
+        """
+        if VectorStoreManager._connection_checked is not None:
+            return VectorStoreManager._connection_checked
+        try:
+            logger.info("检查与huggingface.co的网络连接...")
+            # 使用较短的超时时间快速检查
+            response = requests.head("https://hf-mirror.com", timeout=5)
+            logger.info("成功连接到huggingface.co")
+            VectorStoreManager._connection_checked = True
+        except requests.RequestException:
+            logger.warning("无法连接到huggingface.co，可能存在网络限制")
+            VectorStoreManager._connection_checked = False
+        return VectorStoreManager._connection_checked
+    
+    @classmethod
+    def _get_embeddings(cls):
+        """
+        获取嵌入模型，首次调用时加载并缓存在类上，之后直接复用
+        
+        Returns:
+            Embeddings: 嵌入模型实例
+        """
+        if cls._cached_embeddings is not None:
+            return cls._cached_embeddings
+        
         # 嵌入模型 - 使用轻量级模型
         # 首先检查是否已有缓存的模型文件
         model_cache_path = os.path.join("./models_cache", "sentence-transformers_all-MiniLM-L6-v2")
@@ -65,31 +227,20 @@ class VectorStoreManager:
         if not os.path.exists("./models_cache"):
             os.makedirs("./models_cache")
         
-        # 定义一个简单的检查函数来测试网络连接
-        def check_huggingface_connection():
-            try:
-                logger.info("检查与huggingface.co的网络连接...")
-                # 使用较短的超时时间快速检查
-                response = requests.head("https://hf-mirror.com", timeout=5)
-                logger.info("成功连接到huggingface.co")
-                return True
-            except requests.RequestException:
-                logger.warning("无法连接到huggingface.co，可能存在网络限制")
-                return False
-        
         # 首先尝试使用假嵌入模型（最可靠的方式）
         logger.info("考虑到网络连接限制，优先使用假嵌入模型以确保程序正常运行")
         embeddings = FakeEmbeddings(size=384)
         logger.info("已初始化假嵌入模型")
         
         # 仅在有网络连接时尝试加载真实模型
-        if check_huggingface_connection():
+        if cls._check_huggingface_connection():
             logger.info("尝试加载HuggingFace嵌入模型...")
             try:
                 # 先尝试直接使用LangChain的HuggingFaceEmbeddings
                 embeddings = HuggingFaceEmbeddings(
                     model_name="all-MiniLM-L6-v2",
                     model_kwargs={'device': 'cpu'},
+                    encode_kwargs={"batch_size": EMBED_BATCH_SIZE, "normalize_embeddings": True},
                     cache_folder="./models_cache"
                 )
                 logger.info("成功加载HuggingFace嵌入模型")
@@ -101,10 +252,8 @@ class VectorStoreManager:
             logger.info("提示：在实际生产环境中，建议预先下载模型并配置离线使用")
             logger.info("或考虑使用本地托管的嵌入服务")
         
-        # 创建向量存储
-        vectorstore = FAISS.from_documents(chunks, embeddings)
-        self.vectorstore = vectorstore
-        return vectorstore
+        cls._cached_embeddings = embeddings
+        return embeddings
     
     def setup_retriever(self, vectorstore, k=3):
         """
@@ -113,23 +262,26 @@ class VectorStoreManager:
             vectorstore: 向量存储实例
             k: 混合检索的总文档数量
         Returns:
-            EnsembleRetriever: 混合检索器实例
+            RRFRetriever: 混合检索器实例
         """
         if vectorstore:
-            # 获取向量存储中的所有文档
+            # 获取向量存储中的所有文档（直接使用字典视图，不额外复制）
             all_docs = vectorstore.docstore._dict.values()
-            docs_list = list(all_docs) if isinstance(all_docs, dict) else list(all_docs)
             # 创建向量检索器
             vector_retriever = vectorstore.as_retriever(search_kwargs={"k": k})
             logger.info("已创建向量检索器")
-            # 创建BM25检索器
-            bm25_retriever = BM25Retriever.from_documents(docs_list)
-            bm25_retriever.k = k  # 设置BM25检索的文档数量
+            # 创建BM25检索器，优先使用向量化实现的bm25s
+            if BM25S_AVAILABLE:
+                bm25_retriever = BM25sRetriever.from_documents(all_docs, k=k)
+            else:
+                bm25_retriever = BM25Retriever.from_documents(all_docs)
+                bm25_retriever.k = k  # 设置BM25检索的文档数量
             logger.info("已创建BM25关键词检索器")
-            # 创建混合检索器，权重可以根据需要调整
-            ensemble_retriever = EnsembleRetriever(
+            # 创建混合检索器，使用倒数排名融合合并两路结果
+            ensemble_retriever = RRFRetriever(
                 retrievers=[vector_retriever, bm25_retriever],
-                weights=[0.7, 0.3]  # 向量检索权重0.7，BM25权重0.3
+                k=60,
+                top_k=k
             )
             logger.info("已创建混合检索器，结合向量检索和BM25关键词检索")
 
@@ -1,11 +1,11 @@
 # -*- coding: utf-8 -*-
+import asyncio
 import logging
 from langgraph.graph.state import StateGraph
-from langgraph.graph import END
-from typing import Dict, Any
+from langgraph.graph import START, END
+from langgraph.types import StreamWriter
+from typing import Dict, Any, AsyncIterator
 from langchain_core.messages import HumanMessage 
-import redis
-from langgraph.checkpoint.redis import RedisSaver
 from zhai_agent.models.chat_state import ChatState
 from zhai_agent.rag.rag_manager import RAGManager
 from zhai_agent.workflow.workflow_nodes import WorkflowNodes
@@ -16,16 +16,17 @@ logger = logging.getLogger(__name__)
 class WorkflowManager:
     """
     工作流管理器 - 优化版
-    流程：(RAG + KG Search) -> Chat -> (Save Memory + KG Build [后台运行])
+    流程：(Memory + RAG + KG Search) -> Chat -> (Save Memory + KG Build [后台运行])
     """
     
-    def __init__(self, retriever=None):
+    def __init__(self, retriever=None, mirix_agent: MirixMemoryAgent = None):
         self.retriever = retriever
         self.rag_manager = RAGManager()
         self.app = None
         
-        # 初始化记忆Agent
-        custom_mirix_agent = MirixMemoryAgent()
+        # 初始化记忆Agent（允许外部传入已有实例）
+        custom_mirix_agent = mirix_agent or MirixMemoryAgent()
+        self.mirix_agent = custom_mirix_agent
         
         # 初始化节点逻辑处理类
         self.workflow_nodes = WorkflowNodes(
@@ -34,24 +35,28 @@ class WorkflowManager:
             mirix_agent=custom_mirix_agent
         )
 
-    # --- 节点包装方法 (保持不变) ---
-    def get_mirix_memory_node(self, state: ChatState) -> Dict[str, Any]:
-        return self.workflow_nodes.mirix_memory_node(state)
 
-    def rag_node(self, state: ChatState) -> Dict[str, Any]:
-        return self.workflow_nodes.rag_node(state)
+    # --- 节点包装方法 ---
+    # 节点内部是阻塞 I/O（LLM、Redis、Neo4j 等），包装为异步节点并放到线程中执行，
+    # 使 ainvoke 下并行分支的耗时真正重叠；知识图谱节点本身已是异步实现，直接 await
+    async def get_mirix_memory_node(self, state: ChatState) -> Dict[str, Any]:
+        return await asyncio.to_thread(self.workflow_nodes.mirix_memory_node, state)
+
+    async def rag_node(self, state: ChatState) -> Dict[str, Any]:
+        return await asyncio.to_thread(self.workflow_nodes.rag_node, state)
     
-    def kg_search_node(self, state: ChatState) -> Dict[str, Any]:
-        return self.workflow_nodes.kg_search_node(state)
+    async def kg_search_node(self, state: ChatState) -> Dict[str, Any]:
+        return await self.workflow_nodes.kg_search_node(state)
     
-    def chat_node(self, state: ChatState) -> Dict[str, Any]:
-        return self.workflow_nodes.chat_node(state)
+    async def chat_node(self, state: ChatState, writer: StreamWriter) -> Dict[str, Any]:
+        # 回复逐段生成，片段经 writer 推送给 stream_mode="custom" 的调用方
+        return await self.workflow_nodes.achat_node(state, writer)
 
-    def store_mirix_memory_node(self, state: ChatState) -> Dict[str, Any]:
-        return self.workflow_nodes.store_mirix_memory_node(state)
+    async def store_mirix_memory_node(self, state: ChatState) -> Dict[str, Any]:
+        return await asyncio.to_thread(self.workflow_nodes.store_mirix_memory_node, state)
     
-    def llm_kg_node(self, state: ChatState) -> Dict[str, Any]:
-        return self.workflow_nodes.llm_kg_node(state)
+    async def llm_kg_node(self, state: ChatState) -> Dict[str, Any]:
+        return await self.workflow_nodes.llm_kg_node(state)
     
     # --- 核心工作流构建 ---
 
@@ -59,10 +64,9 @@ class WorkflowManager:
         """
         创建并行工作流
         优化后流程: 
-        1. Start -> Load Memory
-        2. Parallel -> (RAG & KG Search) [读操作]
-        3. Merge -> Generate Answer [回复用户]
-        4. Parallel -> (Save Memory & KG Build) [写操作，后台处理] -> End
+        1. Start -> Parallel (Load Memory & RAG & KG Search) [读操作，互不依赖]
+        2. Merge -> Generate Answer [回复用户]
+        3. Parallel -> (Save Memory & KG Build) [写操作，后台处理] -> End
         """
         workflow = StateGraph(ChatState)
         
@@ -78,32 +82,33 @@ class WorkflowManager:
 
         # 2. 定义边 (Edges)
         
-        # 1. 设置唯一入口：先加载短期记忆
-        # 这样确保 state["messages"] 最先被填充历史记录
-        workflow.set_entry_point("get_memory")
-        
-        # 2. 长期记忆获取完毕 -> 开启并行检索 (RAG + KG)
-        workflow.add_edge("get_memory", "rag_search")
-        workflow.add_edge("get_memory", "kg_search")
+        # 1. 入口同时开启记忆加载与检索 (Memory + RAG + KG)
+        # RAG 和 KG 检索只依赖当前问题，不需要等待长期记忆，三者耗时取最慢的一个
+        workflow.add_edge(START, "get_memory")
+        workflow.add_edge(START, "rag_search")
+        workflow.add_edge(START, "kg_search")
         
-        # 3. 检索汇聚 -> 生成回复
+        # 2. 记忆与检索汇聚 -> 生成回复
+        workflow.add_edge("get_memory", "generate_answer")
         workflow.add_edge("rag_search", "generate_answer")
         workflow.add_edge("kg_search", "generate_answer")
         
-        # 4. 生成回复 -> 并行后台任务 (存记忆、建图谱)
+        # 3. 生成回复 -> 并行后台任务 (存记忆、建图谱)
         workflow.add_edge("generate_answer", "save_memory")
         workflow.add_edge("generate_answer", "kg_build")
         
-        # 5. 结束
+        # 4. 结束
         workflow.add_edge("save_memory", END)
         workflow.add_edge("kg_build", END)
         
         self.app = workflow.compile()
         return self.app
      
-    def process_user_request(self, user_message: str, user_name: str = "default_user", session_id: str = "default_session") -> Dict[str, Any]:
+    async def stream_user_request(self, user_message: str, user_name: str = "default_user", session_id: str = "default_session") -> AsyncIterator[Dict[str, Any]]:
         """
-        处理用户请求
+        流式处理用户请求，每个节点完成后立即产出该节点的状态更新，
+        调用方无需等待记忆保存和图谱构建结束即可展示回复；
+        回复生成过程中额外产出 {"token": 片段} 事件
         """
         if self.app is None:
             self.create_workflow()
@@ -116,16 +121,12 @@ class WorkflowManager:
             "query": user_message
         }
         
-        # 执行工作流
         try:
-            # invoke 接受字典作为输入
-            result = self.app.invoke(inputs,config=config)
-            return result
+            async for _, event in self.app.astream(inputs, config=config, stream_mode=["updates", "custom"]):
+                yield event
         except Exception as e:
-            logger.error(f"工作流执行出错: {e}")
-            import traceback
-            traceback.print_exc()
-            return {"error": str(e)}
+            logger.exception("工作流执行出错: %s", e)
+            yield {"error": str(e)}
     
     def visualize_workflow(self, output_file="workflow_graph.png"):
         """可视化工作流"""
@@ -1,13 +1,23 @@
+import asyncio
+import hashlib
 import json
 import logging
-from typing import Dict, Any, List
+import re
+from concurrent.futures import ThreadPoolExecutor
+from functools import cached_property
+from typing import Dict, Any, List, Optional, Tuple
+import numpy as np
 from zhai_agent.models.chat_state import ChatState
 from zhai_agent.rag.rag_manager import RAGManager
-from zhai_agent.prompt.prompt_builder import PromptBuilder
+from zhai_agent.prompt.prompt_builder import PromptBuilder, get_prompt_builder
 from zhai_agent.mirix_memory.memory_agent import MirixMemoryAgent
-from zhai_agent.kg.kg_manager import KGManager
+from zhai_agent.kg.kg_manager import get_kg_manager_instance
 from zhai_agent.utils.trans_messages_to_string import trans_messages_to_string
+from zhai_agent.utils.llm_cache import InMemoryCache, MAX_CACHEABLE_TEMPERATURE
+from zhai_agent.utils.semantic_cache import SemanticCache
+from zhai_agent.vector_store.vector_store_manager import VectorStoreManager
 from langchain_core.documents import Document
+from langgraph.types import StreamWriter
 from zhai_agent.prompt.mirix_memory_prompt import build_mirix_memory_prompt
 from zhai_agent.kg.kg_tools import get_kg_tools
 from langchain_core.utils.function_calling import convert_to_openai_tool
@@ -16,14 +26,104 @@ from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
 
 
 MEMORY_UPDATE_INTERVAL = 3  # 每3轮对话更新一次记忆
+MEMORY_WRITE_CHAR_BUDGET = 8000  # 单次写入MIRIX的对话字符上限，超出时保留末尾
+RETRIEVAL_CACHE_SIZE = 512  # 相同查询的检索结果缓存条数
+RETRIEVAL_CACHE_TTL = 300  # 检索结果缓存时间（秒）
+RETRIEVAL_SEMANTIC_THRESHOLD = 0.95  # 语义相近的查询复用检索结果所需的余弦相似度
+RETRIEVAL_SEMANTIC_CACHE_SIZE = 1024  # 检索结果语义缓存的条数
+RETRIEVAL_CACHE_NAMESPACE = "rag"  # 知识库对所有用户相同，检索结果不按用户隔离
+MEMORY_SYNC_CACHE_SIZE = 4096  # 记录上次长期记忆同步摘要的用户数上限
+MEMORY_SYNC_CACHE_TTL = 3600  # 同步摘要的保留时间（秒）
+KG_TOOL_CACHE_SIZE = 512  # 每个只读知识图谱工具的结果缓存条数
+KG_CONTEXT_CACHE_SIZE = 2048  # 相同问题的知识图谱查询结果缓存条数
+KG_CONTEXT_CACHE_TTL = 300  # 知识图谱查询结果缓存时间（秒），图谱写入后全部失效
+# 只读知识图谱工具的结果缓存时间（秒），图谱写入后全部失效
+KG_TOOL_CACHE_TTL = {
+    'kg_get_entity': 300,
+    'kg_get_relationships': 300,
+    'kg_search_entities': 120,
+    'kg_get_graph_stats': 60,
+}
+TOOL_CALL_TIMEOUT = 30  # 单个工具调用的超时时间（秒）
+# 依赖同批次其它工具结果的工具：创建关系要求两端实体已存在，需在其它写入工具完成后执行
+DEFERRED_TOOLS = frozenset({"kg_create_relationship"})
+
+# 尝试导入orjson加速工具参数的解析，但不强制要求
+ORJSON_AVAILABLE = False
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    pass
+
+
+def _loads(data):
+    """
+    解析工具参数，优先使用 orjson；orjson 拒绝的输入（如 NaN）回退到标准库
+    """
+    if ORJSON_AVAILABLE:
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            pass
+    return json.loads(data)
 
 # 配置日志
 logger = logging.getLogger(__name__)
 
+# 寒暄、致谢等不涉及任何实体的消息，无需查询知识图谱
+CHITCHAT_PATTERN = re.compile(
+    r"^\s*(你好|您好|嗨|哈喽|早上好|中午好|下午好|晚上好|晚安|谢谢|多谢|感谢|好的|好|嗯+|哦+|哈+|"
+    r"ok|okay|hi|hello|hey|thanks|thank you|bye|再见|拜拜|收到|明白了?|知道了|没事|没问题)"
+    r"[\s!！。.~～,，?？呀啊呢吧哦]*$",
+    re.IGNORECASE
+)
+# 问题涉及用户自身时，在LLM决策期间预先查询用户的关系（提示词要求"我"对应当前用户）
+FIRST_PERSON_PATTERN = re.compile(r"我|\b(?:i|me|my|mine)\b", re.IGNORECASE)
+RELATIONSHIP_TOOL = 'kg_get_relationships'
+# 知识图谱意图判断：关键词命中或与示例问题足够相似时才调用LLM决策图谱查询
+KG_INTENT_PATTERN = re.compile(
+    r"谁|关系|喜欢|讨厌|爱吃|爱喝|认识|朋友|家人|同事|工作|住在|位于|属于|拥有|名字|叫什么|知识图谱|图谱|实体|"
+    r"\b(?:who|whom|whose|relat\w*|likes?|friends?|knows?|family|works?|lives?|owns?|graph|entit\w*)\b",
+    re.IGNORECASE
+)
+KG_INTENT_EXEMPLARS = (
+    "我喜欢吃什么", "我喜欢喝什么", "我的朋友是谁", "我在哪里工作", "我住在哪里",
+    "他和她是什么关系", "这个人是谁", "某某喜欢什么", "知识图谱里有哪些实体", "图谱里有多少个节点",
+    "who is this person", "what does he like", "how are they related", "where does she work",
+    "who are my friends", "what do I own", "what is the relationship between them",
+    "which organization does he belong to", "how many entities are in the graph", "what do you know about me",
+)
+KG_INTENT_THRESHOLD = 0.5
+# 搜索命中后自动继续查询关系的实体数上限，以及从搜索结果中解析实体名的模式
+FOLLOW_UP_MAX_ENTITIES = 3
+SEARCH_HIT_PATTERN = re.compile(r"^\d+\. (.+) \([^()]*\)$", re.MULTILINE)
+
+# 知识图谱工具在模块加载时转换一次，所有实例共享
+SEARCH_TOOL_NAMES = frozenset({'kg_search_entities', 'kg_get_entity', 'kg_get_graph_stats', 'kg_get_relationships'})
+BUILD_TOOL_NAMES = frozenset({'kg_create_entity', 'kg_create_relationship', 'kg_create_knowledge_triple'})  # 根据实际工具名调整
+_KG_TOOLS = get_kg_tools()
+_KG_TOOL_MAP = {t.name: t for t in _KG_TOOLS if hasattr(t, 'name')}
+_SEARCH_TOOLS = [t for t in _KG_TOOLS if t.name in SEARCH_TOOL_NAMES]
+_BUILD_TOOLS = [t for t in _KG_TOOLS if t.name in BUILD_TOOL_NAMES]
+# 工具定义按名称排序，保证每次请求的前缀稳定
+_OPENAI_SEARCH_TOOLS = sorted(
+    (convert_to_openai_tool(t) for t in _SEARCH_TOOLS),
+    key=lambda t: t["function"]["name"]
+)
+_OPENAI_BUILD_TOOLS = sorted(
+    (convert_to_openai_tool(t) for t in _BUILD_TOOLS),
+    key=lambda t: t["function"]["name"]
+)
+
 class WorkflowNodes:
     """
     工作流节点类，封装各种工作流节点的逻辑
     """
+    # 工具调用均为 I/O 密集（Neo4j），同一轮的多个调用并发执行
+    _TOOL_POOL = ThreadPoolExecutor(max_workers=8, thread_name_prefix="kg-tool")
+    # 图谱意图示例问题的向量矩阵（首次使用时编码）
+    _KG_INTENT_MATRIX = None
     
     def __init__(self, rag_manager: RAGManager, retriever=None, prompt_builder: PromptBuilder = None, mirix_agent: MirixMemoryAgent = None):
         """
@@ -36,14 +136,42 @@ class WorkflowNodes:
         """
         self.rag_manager = rag_manager
         self.retriever = retriever
-        self.context_managers = {}  # 存储不同会话的上下文管理器实例
-        self.prompt_builder = prompt_builder or PromptBuilder()
+        self.prompt_builder = prompt_builder or get_prompt_builder()
+        # 低温度、无工具调用的LLM响应缓存
+        self.llm_cache = InMemoryCache()
+        # 知识图谱查询结果的语义缓存，按用户隔离
+        self.sem_cache = SemanticCache()
+        # 知识图谱查询结果的精确缓存，按 (用户, 规范化问题) 命中，连向量编码也省去
+        self._kg_context_cache = InMemoryCache(maxsize=KG_CONTEXT_CACHE_SIZE, ttl=KG_CONTEXT_CACHE_TTL)
+        # 只读知识图谱工具的结果缓存，按 (工具名, 参数) 命中，热点实体不再重复查询 Neo4j
+        self.kg_tool_cache = {
+            name: InMemoryCache(maxsize=KG_TOOL_CACHE_SIZE, ttl=ttl)
+            for name, ttl in KG_TOOL_CACHE_TTL.items()
+        }
+        # 检索器在实例生命周期内不变，相同查询直接复用检索+重排结果
+        self._retrieval_cache = InMemoryCache(maxsize=RETRIEVAL_CACHE_SIZE, ttl=RETRIEVAL_CACHE_TTL)
+        # 改写/近义的查询按向量相似度复用检索+重排结果
+        self._retrieval_sem_cache = SemanticCache(
+            threshold=RETRIEVAL_SEMANTIC_THRESHOLD,
+            ttl=RETRIEVAL_CACHE_TTL,
+            max_entries=RETRIEVAL_SEMANTIC_CACHE_SIZE
+        )
         # 优先使用传入的mirix_agent参数，如果没有传入才创建默认实例
         self.mirix_agent = mirix_agent or MirixMemoryAgent()
-        # --- 新增：初始化短期记忆管理器 ---
+        # 用户名 -> 上次同步到长期记忆的内容摘要，内容未变化时跳过写入
+        self._last_memory_sync = InMemoryCache(maxsize=MEMORY_SYNC_CACHE_SIZE, ttl=MEMORY_SYNC_CACHE_TTL)
+        # 短期记忆（Redis）与知识图谱管理器（Neo4j）在首次使用时才连接，见下方的 cached_property
+
+    # --- 延迟初始化的外部依赖：构造节点时不再阻塞于 Redis / Neo4j 握手 ---
+
+    @cached_property
+    def short_memory(self):
+        """
+        短期记忆管理器，首次访问时连接 Redis，失败时为 None
+        """
         # 你可以根据需要配置 host, port 等参数，或者从配置文件读取
         try:
-            self.short_memory = get_shortmemory_instance(
+            short_memory = get_shortmemory_instance(
                 host='localhost', 
                 port=6379, 
                 db=0, 
@@ -52,61 +180,99 @@ class WorkflowNodes:
                 max_memory_size=20 # 保留最近20条
             )
             logger.info("✅ 短期记忆模块(Redis)初始化成功")
+            return short_memory
         except Exception as e:
             logger.error(f"❌ 短期记忆模块初始化失败: {e}")
-            self.short_memory = None
-        # --------------------------------
-        # 初始化知识图谱管理器
+            return None
+
+    @cached_property
+    def kg_manager(self):
+        """
+        知识图谱管理器，首次访问时连接 Neo4j，失败时为 None
+        """
         try:
-            self.kg_manager = KGManager()
+            kg_manager = get_kg_manager_instance()
             logger.info("✅ 知识图谱管理器初始化成功")
+            return kg_manager
         except Exception as e:
             logger.error(f"❌ 知识图谱管理器初始化失败: {str(e)}")
-            # 创建一个空的KGManager实例，避免程序崩溃
-            self.kg_manager = None
-        # 优化1: 预加载并缓存工具
-        if self.kg_manager:
-            self.kg_tools = get_kg_tools()
-        else:
-            self.kg_tools = []
             logger.warning("⚠️ 知识图谱工具初始化跳过，KGManager不可用")
-    
-        # 预先筛选查询类工具
-        self.search_tools = [
-            t for t in self.kg_tools 
-            if t.name in ['kg_search_entities', 'kg_get_entity', 'kg_get_graph_stats','kg_get_relationships']
-        ]
-        self.openai_search_tools = [convert_to_openai_tool(t) for t in self.search_tools]
-        
-        # 预先筛选构建类工具 (给 llm_kg_node 用)
-        self.build_tools = [
-            t for t in self.kg_tools 
-            if t.name in ['kg_create_entity', 'kg_create_relationship','kg_create_knowledge_triple'] # 根据实际工具名调整
-        ]
-        self.openai_build_tools = [convert_to_openai_tool(t) for t in self.build_tools]
+            return None
 
+    async def _aget_kg_manager(self):
+        """
+        异步节点中获取知识图谱管理器，首次连接放到线程中执行，避免阻塞事件循环
+        """
+        if "kg_manager" in self.__dict__:
+            return self.kg_manager
+        return await asyncio.to_thread(getattr, self, "kg_manager")
+
+    # 工具及其 OpenAI 格式在模块加载时已转换，图库可用时直接复用
+    @property
+    def kg_tools(self):
+        return _KG_TOOLS if self.kg_manager else []
+
+    @property
+    def kg_tool_map(self):
+        return _KG_TOOL_MAP if self.kg_manager else {}
+
+    @property
+    def search_tools(self):
+        return _SEARCH_TOOLS if self.kg_manager else []
 
-    def llm_kg_node(self, state: ChatState) -> Dict[str, Any]:
+    @property
+    def openai_search_tools(self):
+        return _OPENAI_SEARCH_TOOLS if self.kg_manager else []
+
+    # 构建类工具 (给 llm_kg_node 用)
+    @property
+    def build_tools(self):
+        return _BUILD_TOOLS if self.kg_manager else []
+
+    @property
+    def openai_build_tools(self):
+        return _OPENAI_BUILD_TOOLS if self.kg_manager else []
+
+    @staticmethod
+    def _last_user_message(state: ChatState) -> str:
+        """
+        获取最后一条消息的文本内容，没有消息时返回空字符串
+        messages 经过 add_messages 归并后必定是 BaseMessage，直接读取 content
+        """
+        return state.messages[-1].content if state.messages else ""
+
+    async def llm_kg_node(self, state: ChatState) -> Dict[str, Any]:
         """
         【修改版】知识图谱构建节点
         职责：仅负责从用户对话中提取知识并存入图谱（写操作）。
         特点：不生成回复，不阻塞对话流，静默运行。
         """
         try:
+            # 图库不可用时没有可调用的构建工具，无需请求 LLM
+            if await self._aget_kg_manager() is None:
+                return {}
+            
             # 1. 获取用户输入
-            user_message = state.messages[-1].content if state.messages else ""
+            user_message = self._last_user_message(state)
+            # 空消息或纯寒暄中没有可提取的知识，省去一次LLM请求
+            if not user_message.strip() or CHITCHAT_PATTERN.match(user_message):
+                return {}
             
             # 2. 构建专门的知识提取 Prompt
             # 强制 LLM 只关注提取信息，不要通过 content 说话
-            system_prompt = self.prompt_builder.get_kg_tools_prompt(state.memory_context)
+            # 固定指令在前、记忆信息在后，使服务端前缀缓存可以命中
+            static_prompt, dynamic_prompt = self.prompt_builder.get_kg_tools_prompt(
+                state.memory_context.strip() or "暂无相关记忆信息"
+            )
             
             messages = [
-                {"role": "system", "content": system_prompt},
+                {"role": "system", "content": static_prompt},
+                {"role": "system", "content": dynamic_prompt},
                 {"role": "user", "content": user_message}
             ]
             
             # 3. 调用 LLM (仅一轮，用于触发工具)
-            llm_response = self.rag_manager.llm_client.create_chat_completion(
+            llm_response = await self._acached_completion(
                 messages=messages,
                 tools=self.openai_build_tools,
                 tool_choice="auto", # 让 LLM 决定是否需要提取
@@ -115,14 +281,19 @@ class WorkflowNodes:
             # 4. 处理工具调用
             tool_calls = llm_response.get("tool_calls")
             if tool_calls:
-                logger.info(f"[KG Build] 正在提取知识，调用 {len(tool_calls)} 个工具")
+                logger.debug("[KG Build] 正在提取知识，调用 %d 个工具", len(tool_calls))
                 
                 # 执行所有工具 (存入 Neo4j)
-                tool_results = self._execute_tool_calls(tool_calls, self.kg_tools)
+                tool_results = await asyncio.to_thread(self._execute_tool_calls, tool_calls, self.kg_tool_map)
+                # 图谱为所有用户共享，更新后全部缓存的查询结果及只读工具结果失效
+                self.sem_cache.clear()
+                self._kg_context_cache.clear()
+                for cache in self.kg_tool_cache.values():
+                    cache.clear()
                 
                 # 记录日志即可，不需要将结果写回 state.messages 干扰聊天历史
                 for res in tool_results:
-                    logger.info(f"工具执行结果: {res['result']}")
+                    logger.debug("工具执行结果: %s", res['result'])
             else:
                 logger.info("[KG Build] 本轮对话无新知识需要提取")
                 
@@ -135,6 +306,30 @@ class WorkflowNodes:
             
         return {}
         
+    async def _acached_completion(self, messages, tools=None, tool_choice=None, temperature=0.9):
+        """
+        带缓存的异步聊天完成：温度较低且响应不含工具调用时缓存结果，
+        含工具调用的响应每次都重新请求，保证工具按需执行
+        """
+        llm_client = self.rag_manager.llm_client
+        if temperature > MAX_CACHEABLE_TEMPERATURE:
+            return await llm_client.acreate_chat_completion(
+                messages=messages, tools=tools, tool_choice=tool_choice, temperature=temperature
+            )
+        
+        key = InMemoryCache.make_key(messages, tools, temperature)
+        cached = self.llm_cache.get(key)
+        if cached is not None:
+            logger.debug("LLM响应缓存命中")
+            return cached
+        
+        response = await llm_client.acreate_chat_completion(
+            messages=messages, tools=tools, tool_choice=tool_choice, temperature=temperature
+        )
+        if not response.get("tool_calls") and response.get("finish_reason") != "error":
+            self.llm_cache.set(key, response)
+        return response
+        
     def chat_node(self, state: ChatState) -> Dict[str, Any]:
         """
         纯聊天节点，不调用工具，仅基于已有信息进行对话
@@ -146,14 +341,14 @@ class WorkflowNodes:
         try:
             # 获取最后一条用户消息
             if not state.messages:
-                return state.model_dump()
-            last_message = state.messages[-1]
-            user_message = last_message.content if hasattr(last_message, 'content') else str(last_message)
+                # 没有消息时无需更新任何字段，不必复制整个状态
+                return {}
+            user_message = self._last_user_message(state)
             # 调用LLM生成回复
             ai_response = self._generate_response(user_message, state)
             # 创建AI消息并添加到状态
             ai_message = AIMessage(content=ai_response)
-            logger.info(f"纯聊天回复: {ai_response[:100]}...")
+            logger.debug("纯聊天回复: %.100s...", ai_response)
             state.round+=1
         except Exception as e:
             logger.error(f"聊天节点出错: {str(e)}")
@@ -162,46 +357,216 @@ class WorkflowNodes:
             ai_message = AIMessage(content=error_response)
 
         return {"messages": [ai_message]}
+
+    async def achat_node(self, state: ChatState, writer: Optional[StreamWriter] = None) -> Dict[str, Any]:
+        """
+        流式聊天节点，与 chat_node 相同但逐段生成回复，
+        每个片段通过 writer 以 {"token": 片段} 推送给 stream_mode="custom" 的调用方
+        Args:
+            state: 聊天状态
+            writer: LangGraph 注入的自定义流写入器
+        Returns:
+            dict: 更新后的状态
+        """
+        try:
+            if not state.messages:
+                return {}
+            user_message = self._last_user_message(state)
+            final_prompt = await asyncio.to_thread(self._build_final_prompt, user_message, state)
+            
+            parts = []
+            async for chunk in self.rag_manager.astream_llm(final_prompt):
+                parts.append(chunk)
+                if writer is not None:
+                    writer({"token": chunk})
+            ai_response = "".join(parts)
+            ai_message = AIMessage(content=ai_response)
+            logger.debug("纯聊天回复: %.100s...", ai_response)
+            state.round+=1
+        except Exception as e:
+            logger.error(f"聊天节点出错: {str(e)}")
+            error_response = "抱歉，我在处理您的消息时遇到了问题。请稍后再试。"
+            ai_message = AIMessage(content=error_response)
+
+        return {"messages": [ai_message]}
     
     
     
-    def _execute_tool_calls(self, tool_calls, available_tools) -> List[Dict[str, Any]]:
+    def _execute_tool_calls(self, tool_calls, tool_map) -> List[Dict[str, Any]]:
         """
-        执行工具调用
+        执行工具调用，只读工具并发执行；写入工具逐个执行，避免并发 MERGE 同名实体产生重复节点。
+        结果保持原始顺序
+        Args:
+            tool_calls: LLM返回的工具调用列表
+            tool_map: 工具名到工具的映射
         """
-        results = []
+        results: List[Dict[str, Any]] = [None] * len(tool_calls)
+        # 同名同参的重复调用只执行第一次，结果再分发给其余调用
+        duplicates: Dict[int, int] = {}
+        first_seen: Dict[tuple, int] = {}
+        for i, tool_call in enumerate(tool_calls):
+            key = self._tool_call_key(tool_call)
+            if key in first_seen:
+                duplicates[i] = first_seen[key]
+            else:
+                first_seen[key] = i
+        
+        writes = []
+        deferred = []
+        futures = []
+        for i, tool_call in enumerate(tool_calls):
+            if i in duplicates:
+                continue
+            if tool_call.function.name in SEARCH_TOOL_NAMES:
+                futures.append((i, self._TOOL_POOL.submit(self._invoke_one, tool_call, tool_map)))
+            elif tool_call.function.name in DEFERRED_TOOLS:
+                deferred.append(i)
+            else:
+                writes.append(i)
         
-        # 创建工具映射
-        tool_map = {tool.name: tool for tool in available_tools if hasattr(tool, 'name')}
+        # 写入工具按原始顺序逐个执行，关系类工具放在实体创建完成之后
+        for i in writes + deferred:
+            results[i] = self._invoke_one(tool_calls[i], tool_map)
+        self._collect_tool_results(futures, tool_calls, results)
         
-        for tool_call in tool_calls:
+        if duplicates:
+            logger.debug("跳过重复工具调用 %d 个", len(duplicates))
+        for i, source in duplicates.items():
+            results[i] = {
+                "call_id": tool_calls[i].id,
+                "result": results[source]["result"]
+            }
+        return results
+    
+    @staticmethod
+    def _tool_call_key(tool_call) -> tuple:
+        """
+        生成工具调用的去重键：工具名 + 按键排序后的参数
+        """
+        try:
+            args_key = InMemoryCache.make_key(_loads(tool_call.function.arguments))
+        except Exception:
+            args_key = tool_call.function.arguments
+        return tool_call.function.name, args_key
+    
+    @staticmethod
+    def _collect_tool_results(futures, tool_calls, results) -> None:
+        """
+        收集并发工具调用的结果，按原始下标写回
+        """
+        for i, future in futures:
             try:
-                function_name = tool_call.function.name
-                function_args = json.loads(tool_call.function.arguments)
-                
-                if function_name in tool_map:
-                    tool = tool_map[function_name]
-                    # 执行工具调用
-                    result = tool.invoke(function_args)
-                    results.append({
-                        "call_id": tool_call.id,
-                        "result": str(result)
-                    })
-                    logger.info(f"工具调用成功: {function_name} -> {result}")
-                else:
-                    results.append({
-                        "call_id": tool_call.id,
-                        "result": f"错误: 未找到工具 {function_name}"
-                    })
-                    
+                results[i] = future.result(timeout=TOOL_CALL_TIMEOUT)
             except Exception as e:
                 error_msg = f"工具调用失败: {str(e)}"
                 logger.error(error_msg)
-                results.append({
-                    "call_id": tool_call.id,
+                results[i] = {
+                    "call_id": tool_calls[i].id,
                     "result": error_msg
-                })
+                }
+    
+    def _invoke_one(self, tool_call, tool_map) -> Dict[str, Any]:
+        """
+        执行单个工具调用
+        """
+        try:
+            function_name = tool_call.function.name
+            function_args = _loads(tool_call.function.arguments)
+            
+            if function_name in tool_map:
+                return {
+                    "call_id": tool_call.id,
+                    "result": self._run_tool(tool_map[function_name], function_args)
+                }
+            return {
+                "call_id": tool_call.id,
+                "result": f"错误: 未找到工具 {function_name}"
+            }
+                
+        except Exception as e:
+            error_msg = f"工具调用失败: {str(e)}"
+            logger.error(error_msg)
+            return {
+                "call_id": tool_call.id,
+                "result": error_msg
+            }
+
+    def _run_tool(self, tool, function_args: Dict[str, Any]) -> str:
+        """
+        执行工具，只读工具优先读取结果缓存
+        """
+        cache = self.kg_tool_cache.get(tool.name)
+        key = InMemoryCache.make_key(self._canonical_args(tool, function_args)) if cache is not None else None
+        if cache is not None:
+            cached = cache.get(key)
+            if cached is not None:
+                logger.debug("工具结果缓存命中: %s", tool.name)
+                return cached
+        
+        # 执行工具调用
+        result = str(tool.invoke(function_args))
+        logger.debug("工具调用成功: %s -> %s", tool.name, result)
+        # 工具内部出错时返回 ❌ 开头的提示，不写入缓存
+        if cache is not None and not result.startswith("❌"):
+            cache.set(key, result)
+        return result
+
+    @staticmethod
+    def _canonical_args(tool, function_args: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        按工具参数模型补全默认值，省略默认参数与显式传入默认值的调用共用同一缓存键
+        """
+        try:
+            return tool.args_schema(**function_args).model_dump()
+        except Exception:
+            return function_args
+
+    def _speculate_user_lookup(self, user_message: str, user_name: str):
+        """
+        问题涉及用户自身时，与LLM决策并行预先查询用户的关系并写入工具结果缓存
+        Returns:
+            Future 或 None
+        """
+        tool = self.kg_tool_map.get(RELATIONSHIP_TOOL)
+        if tool is None or not user_name or not FIRST_PERSON_PATTERN.search(user_message):
+            return None
+        return self._TOOL_POOL.submit(self._run_tool, tool, {"entity_name": user_name})
+
+    def _follow_up_relationships(self, tool_calls, tool_results) -> List[Tuple[str, str]]:
+        """
+        多跳查询：搜索命中的实体自动继续查询其关系，作为依赖上一波结果的第二波并发执行，
+        省去LLM再决策一轮；LLM本轮已查询过的实体不再重复查询
+        Args:
+            tool_calls: LLM返回的工具调用列表
+            tool_results: 与 tool_calls 一一对应的执行结果
+        Returns:
+            list: (实体名, 关系查询结果)
+        """
+        tool = self.kg_tool_map.get(RELATIONSHIP_TOOL)
+        if tool is None:
+            return []
+        
+        queried = set()
+        hits = []
+        for tool_call, tool_result in zip(tool_calls, tool_results):
+            function_name = tool_call.function.name
+            if function_name == 'kg_search_entities':
+                hits.extend(SEARCH_HIT_PATTERN.findall(str(tool_result['result'])))
+            elif function_name in (RELATIONSHIP_TOOL, 'kg_get_entity'):
+                try:
+                    args = _loads(tool_call.function.arguments)
+                    queried.add(args.get('entity_name') or args.get('name'))
+                except Exception:
+                    pass
         
+        targets = [name for name in dict.fromkeys(hits) if name not in queried][:FOLLOW_UP_MAX_ENTITIES]
+        futures = [(name, self._TOOL_POOL.submit(self._run_tool, tool, {"entity_name": name})) for name in targets]
+        results = []
+        for name, future in futures:
+            try:
+                results.append((name, future.result(timeout=TOOL_CALL_TIMEOUT)))
+            except Exception as e:
+                logger.error(f"关系追加查询失败: {name} - {str(e)}")
         return results
 
     def rag_node(self, state: ChatState) -> Dict[str, Any]:
@@ -213,25 +578,16 @@ class WorkflowNodes:
             dict: 更新后的状态
         """
         # 获取用户最后一条消息
-        if state.messages:
-            last_message = state.messages[-1]
-            user_message = last_message.content if hasattr(last_message, 'content') else str(last_message)
-        else:
-            user_message = ""
+        user_message = self._last_user_message(state)
         state.query = user_message
-        # 执行文档检索
-        retrieved_docs = self._retrieve_documents(user_message)
-        state.retrieved_documents = [
-            {"content": doc.page_content, "metadata": doc.metadata}
-            for doc in retrieved_docs
-        ]
-        # 对检索到的文档进行重排
-        sorted_docs = self._rerank_documents(retrieved_docs, user_message)
+        # 执行文档检索和重排（归一化后相同的查询命中缓存）
+        # 下游只使用拼接后的 rag_context，不再把文档逐条复制为字典写入状态
+        _, sorted_docs = self._cached_retrieval(user_message)
         
         # 将文档列表转换为字符串格式
-        rag_context_str = ""
-        for i, doc in enumerate(sorted_docs, 1):
-            rag_context_str += f"参考资料{i}：{doc.page_content}\n"
+        rag_context_str = "".join(
+            f"参考资料{i}：{doc.page_content}\n" for i, doc in enumerate(sorted_docs, 1)
+        )
         
         # 修改点：不再调用 self.prompt_builder.build_rag_prompt
         # 而是更新 state
@@ -260,7 +616,7 @@ class WorkflowNodes:
         
         return {"memory_context": memory_context}
 
-    def kg_search_node(self, state: ChatState) -> Dict[str, Any]:
+    async def kg_search_node(self, state: ChatState) -> Dict[str, Any]:
         """
         知识图谱搜索节点 - 完全由LLM决策查询策略
         流程：分析用户需求 → LLM自主选择知识图谱工具查询 → 监控工具调用并整合结果
@@ -271,22 +627,51 @@ class WorkflowNodes:
         """
         try:
             # 获取用户消息
-            if state.messages:
-                last_message = state.messages[-1]
-                user_message = last_message.content if hasattr(last_message, 'content') else str(last_message)
-            else:
-                user_message = ""
+            user_message = self._last_user_message(state)
+            
+            # 空消息、纯寒暄或图库不可用时，直接跳过LLM和图谱查询
+            if (not user_message.strip() or CHITCHAT_PATTERN.match(user_message)
+                    or await self._aget_kg_manager() is None):
+                state.kg_context = ""
+                return {"kg_context": ""}
+            
+            # 相同的问题直接复用之前的查询结果，跳过向量编码、LLM决策和图谱查询
+            cache_key = (state.user_name, " ".join(user_message.split()).casefold())
+            cached_context = self._kg_context_cache.get(cache_key)
+            if cached_context is not None:
+                state.kg_context = cached_context
+                return {"kg_context": cached_context}
+            
+            # 语义相同的问题直接复用之前的查询结果，跳过LLM决策和图谱查询
+            query_vector = await asyncio.to_thread(self._embed_query, user_message)
+            if query_vector is not None:
+                cached_context = self.sem_cache.lookup(state.user_name, query_vector)
+                if cached_context is not None:
+                    self._kg_context_cache.set(cache_key, cached_context)
+                    state.kg_context = cached_context
+                    return {"kg_context": cached_context}
+            
+            # 明显没有图谱查询意图的问题跳过LLM决策
+            if not await asyncio.to_thread(self._has_kg_intent, user_message, query_vector):
+                logger.debug("问题无知识图谱查询意图，跳过图谱查询")
+                state.kg_context = ""
+                return {"kg_context": ""}
+            
+            # 投机执行：LLM决策期间先查询最可能用到的用户关系，命中时工具阶段直接读缓存
+            speculative = self._speculate_user_lookup(user_message, state.user_name)
             
             # 构建系统提示
-            system_prompt = self.prompt_builder.get_kg_search_prompt(state.user_name,user_message)
+            # 固定指令在前、当前上下文在后，使服务端前缀缓存可以命中
+            static_prompt, dynamic_prompt = self.prompt_builder.get_kg_search_prompt(state.user_name,user_message)
                 
             messages = [
-                {"role": "system", "content": system_prompt},
+                {"role": "system", "content": static_prompt},
+                {"role": "system", "content": dynamic_prompt},
                 {"role": "user", "content": user_message}
             ]
             
             # 调用支持工具的LLM进行查询
-            llm_response = self.rag_manager.llm_client.create_chat_completion(
+            llm_response = await self._acached_completion(
                 messages=messages,
                 tools=self.openai_search_tools,
                 tool_choice="auto",
@@ -297,16 +682,31 @@ class WorkflowNodes:
             tool_usage_info = []
             
             if llm_response.get("tool_calls"):
-                logger.info(f"LLM调用 {len(llm_response['tool_calls'])} 个知识图谱工具")
+                logger.debug("LLM调用 %d 个知识图谱工具", len(llm_response['tool_calls']))
                 
+                # 等待投机查询写入缓存，避免相同查询重复执行
+                if speculative is not None:
+                    try:
+                        await asyncio.wrap_future(speculative)
+                    except Exception as e:
+                        logger.warning(f"投机查询失败，按LLM决策正常执行: {str(e)}")
                 # 执行工具调用
-                tool_results = self._execute_tool_calls(llm_response["tool_calls"], self.kg_tools)
+                tool_results = await asyncio.to_thread(
+                    self._execute_tool_calls, llm_response["tool_calls"], self.kg_tool_map
+                )
                 
                 # 收集查询结果
                 for i, tool_result in enumerate(tool_results):
                     tool_call = llm_response["tool_calls"][i]
                     tool_name = getattr(tool_call.function, 'name', 'unknown') if hasattr(tool_call, 'function') else 'unknown'
                     tool_usage_info.append(f"工具: {tool_name}, 结果: {str(tool_result['result'])[:200]}")
+                
+                # 搜索命中的实体继续查询关系，多跳问题在同一轮内完成
+                follow_ups = await asyncio.to_thread(
+                    self._follow_up_relationships, llm_response["tool_calls"], tool_results
+                )
+                for name, result in follow_ups:
+                    tool_usage_info.append(f"工具: {RELATIONSHIP_TOOL}({name}), 结果: {result[:200]}")
             else:
                 logger.info("LLM未调用任何知识图谱工具")
                 tool_usage_info.append("未调用知识图谱工具")
@@ -316,20 +716,66 @@ class WorkflowNodes:
             
             # 将查询结果添加到状态
             state.kg_context = kg_context_str
+            self._kg_context_cache.set(cache_key, kg_context_str)
+            if query_vector is not None:
+                self.sem_cache.add(state.user_name, query_vector, kg_context_str)
             
         except Exception as e:
             error_msg = f"知识图谱搜索出错: {str(e)}"
             logger.error(error_msg)
             
             # 错误处理
-            error_context = f"知识图谱查询出错: {str(e)}"
-            kg_context_str = error_context
-            
-            # 将错误信息添加到提示词构建器
-            self.prompt_builder.kg_tmpl = error_context
+            kg_context_str = f"知识图谱查询出错: {str(e)}"
         
         return {"kg_context": kg_context_str}
 
+    def _has_kg_intent(self, user_message: str, query_vector) -> bool:
+        """
+        判断问题是否可能需要查询知识图谱：关键词、第一人称或与示例问题的相似度任一命中即可，
+        向量不可用时保守地返回 True
+        """
+        if KG_INTENT_PATTERN.search(user_message) or FIRST_PERSON_PATTERN.search(user_message):
+            return True
+        if query_vector is None:
+            return True
+        exemplars = self._kg_intent_matrix()
+        if exemplars is None:
+            return True
+        query = np.asarray(query_vector, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm == 0:
+            return True
+        return float((exemplars @ query).max()) / norm >= KG_INTENT_THRESHOLD
+
+    @classmethod
+    def _kg_intent_matrix(cls):
+        """
+        示例问题的归一化向量矩阵，进程内只编码一次，失败时返回 None
+        """
+        if cls._KG_INTENT_MATRIX is None:
+            try:
+                matrix = np.asarray(
+                    VectorStoreManager._get_embeddings().embed_documents(list(KG_INTENT_EXEMPLARS)),
+                    dtype=np.float32
+                )
+                norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+                cls._KG_INTENT_MATRIX = matrix / np.where(norms == 0, 1.0, norms)
+            except Exception as e:
+                logger.warning(f"图谱意图示例编码失败，不做意图过滤: {str(e)}")
+                return None
+        return cls._KG_INTENT_MATRIX
+
+    @staticmethod
+    def _embed_query(text: str):
+        """
+        使用向量存储相同的嵌入模型编码查询，失败时返回 None
+        """
+        try:
+            return VectorStoreManager._get_embeddings().embed_query(text)
+        except Exception as e:
+            logger.warning(f"查询向量编码失败，跳过语义缓存: {str(e)}")
+            return None
+
     def _retrieve_documents(self, user_message: str) -> List[Document]:
         """
         检索相关文档
@@ -343,12 +789,52 @@ class WorkflowNodes:
         if self.retriever:
             # 检索相关文档
             retrieved_docs = self.rag_manager.retrieve_documents(self.retriever, user_message)
-            logger.info(f"已检索到 {len(retrieved_docs)} 个相关文档片段")
+            logger.debug("已检索到 %d 个相关文档片段", len(retrieved_docs))
         else:
             logger.info("未使用RAG增强，无文档检索步骤")
         return retrieved_docs
     
 
+    def _cached_retrieval(self, user_message: str) -> Tuple[Tuple[Document, ...], Tuple[Document, ...]]:
+        """
+        带缓存的检索+重排：合并空白并忽略大小写后相同的查询直接命中，
+        否则按查询向量的相似度复用语义相近查询的结果
+        Args:
+            user_message: 用户消息
+        Returns:
+            tuple: (检索到的文档, 重排后的文档)
+        """
+        query = " ".join(user_message.split())
+        key = query.casefold()
+        result = self._retrieval_cache.get(key)
+        if result is not None:
+            return result
+        
+        query_vector = self._embed_query(query)
+        if query_vector is not None:
+            result = self._retrieval_sem_cache.lookup(RETRIEVAL_CACHE_NAMESPACE, query_vector)
+        if result is None:
+            result = self._retrieve_and_rerank(query)
+            # 检索失败或索引为空时不缓存，避免暂时性错误在缓存期内持续返回空结果
+            if not result[0]:
+                return result
+            if query_vector is not None:
+                self._retrieval_sem_cache.add(RETRIEVAL_CACHE_NAMESPACE, query_vector, result)
+        self._retrieval_cache.set(key, result)
+        return result
+
+    def _retrieve_and_rerank(self, user_message: str) -> Tuple[Tuple[Document, ...], Tuple[Document, ...]]:
+        """
+        检索并重排文档，结果以元组返回以便缓存
+        Args:
+            user_message: 用户消息
+        Returns:
+            tuple: (检索到的文档, 重排后的文档)
+        """
+        retrieved_docs = self._retrieve_documents(user_message)
+        sorted_docs = self._rerank_documents(retrieved_docs, user_message)
+        return tuple(retrieved_docs), tuple(sorted_docs)
+
     def _rerank_documents(self, retrieved_docs: List[Document], user_message: str) -> List[Document]:
         """
         对检索到的文档进行重排
@@ -358,12 +844,21 @@ class WorkflowNodes:
         Returns:
             List[Document]: 重排后的文档列表
         """
-        return self.rag_manager.reRank(retrieved_docs, user_message)
+        # 所有候选文档在一个批次内完成交叉编码器打分
+        return self.rag_manager.reRank(
+            retrieved_docs, user_message, batch_size=max(1, min(32, len(retrieved_docs)))
+        )
     
     def _generate_response(self, query: str, state: ChatState) -> str:
         """
         生成AI响应
         """
+        return self.rag_manager.call_llm(self._build_final_prompt(query, state))
+
+    def _build_final_prompt(self, query: str, state: ChatState) -> str:
+        """
+        构建生成回复用的最终提示
+        """
         all_messages = state.messages
         history_messages = all_messages[:-1]
         chat_history_str = trans_messages_to_string(history_messages[-5:])
@@ -378,8 +873,8 @@ class WorkflowNodes:
             kg_context=state.kg_context
         )
         
-        logger.info(f"生成的最终提示:\n{final_prompt}")
-        return self.rag_manager.call_llm(final_prompt)
+        logger.debug("生成的最终提示:\n%s", final_prompt)
+        return final_prompt
     
     def store_mirix_memory_node(self, state: ChatState) -> Dict[str, Any]:
         """
@@ -408,13 +903,34 @@ class WorkflowNodes:
         # 防止空内容调用
         if not memory_content.strip():
             return {}
+        # 超长消息只保留末尾，限制记忆写入的提示长度
+        if len(memory_content) > MEMORY_WRITE_CHAR_BUDGET:
+            memory_content = memory_content[-MEMORY_WRITE_CHAR_BUDGET:]
+        # 与上次同步的内容相同时跳过，避免重复调用长期记忆接口
+        digest = hashlib.blake2b(memory_content.encode("utf-8"), digest_size=16).hexdigest()
+        if self._last_memory_sync.get(user_name) == digest:
+            logger.debug("对话内容与上次同步相同，跳过长期记忆更新")
+            return {}
 
         try:
-            logger.info(f"正在更新Mirix长期记忆 (轮次: {state.round}, 同步消息数: {len(recent_messages)})")
-            self.mirix_agent.add_memory(memory_content, user_name=user_name)
+            logger.debug("正在更新Mirix长期记忆 (轮次: %d, 同步消息数: %d)", state.round, len(recent_messages))
+            # 记忆写入结果不影响本轮回复，放到后台执行；写入成功后才记录摘要，失败时下一轮会重试
+            future = self.mirix_agent.add_memory_async(memory_content, user_name=user_name)
+            future.add_done_callback(lambda f: self._record_memory_sync(f, user_name, digest))
         except Exception as e:
             logger.error(f"Mirix记忆更新失败: {str(e)}")
 
         return {}
+
+    def _record_memory_sync(self, future, user_name: str, digest: str) -> None:
+        """
+        长期记忆后台写入完成后的回调，仅在写入成功时记录内容摘要
+        """
+        if future.exception() is not None:
+            return
+        result = future.result()
+        if isinstance(result, dict) and result.get("status") == "error":
+            return
+        self._last_memory_sync.set(user_name, digest)
     
   
\ No newline at end of file